@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from stl import mesh
+from scipy.spatial import Delaunay, ConvexHull
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import terrain  # noqa: E402
+
+
+def synthetic_points(num_points, seed=0):
+    """Returns reproducible SWOT-like scattered points: a 0.2 degree patch with smooth relief."""
+    rng = np.random.default_rng(seed)
+    lons = -79.5 + rng.random(num_points) * 0.2
+    lats = 43.5 + rng.random(num_points) * 0.2
+    values = 75 + np.sin(lons * 60) * np.cos(lats * 45) * 2 + rng.normal(0, 0.05, num_points)
+    return lons, lats, values
+
+
+def build_mesh_loop(lons, lats, values):
+    """The face assembly build_mesh used before it was vectorized (one Python list per triangle)."""
+    x = (lons - np.min(lons)) / (np.max(lons) - np.min(lons)) * terrain.XY_SIZE
+    y = (lats - np.min(lats)) / (np.max(lats) - np.min(lats)) * terrain.XY_SIZE
+    z = (values - np.min(values)) / (np.max(values) - np.min(values)) * terrain.Z_SIZE
+    points2D = np.vstack((x, y)).T
+    tri = Delaunay(points2D)
+
+    faces = []
+    for i, j, k in tri.simplices:
+        faces.append([[x[i], y[i], z[i]], [x[j], y[j], z[j]], [x[k], y[k], z[k]]])
+
+    boundary = ConvexHull(points2D).vertices
+    for n in range(len(boundary)):
+        a, b = boundary[n], boundary[(n + 1) % len(boundary)]
+        faces.append([[x[a], y[a], z[a]], [x[a], y[a], 0], [x[b], y[b], 0]])
+        faces.append([[x[a], y[a], z[a]], [x[b], y[b], 0], [x[b], y[b], z[b]]])
+    for simplex in Delaunay(points2D[boundary]).simplices:
+        i, j, k = boundary[simplex]
+        faces.append([[x[i], y[i], 0], [x[j], y[j], 0], [x[k], y[k], 0]])
+
+    terrain_mesh = mesh.Mesh(np.zeros(len(faces), dtype=mesh.Mesh.dtype))
+    for idx, face in enumerate(faces):
+        terrain_mesh.vectors[idx] = np.array(face)
+    return terrain_mesh
+
+
+def best_of(func, repeat):
+    """Runs func repeat times and returns (best wall time in seconds, last result)."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark vectorized vs. per-face mesh assembly')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help='Point counts to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size (best time is reported)')
+    parser.add_argument('--skip-loop', action='store_true', help='Only time the vectorized build_mesh')
+
+    args = parser.parse_args()
+    print(f"{'points':>10} {'triangles':>10} {'vectorized':>12} {'loop':>12} {'speedup':>8}")
+    for size in args.sizes:
+        lons, lats, values = synthetic_points(size)
+        fast, fast_mesh = best_of(lambda: terrain.build_mesh(lons, lats, values), args.repeat)
+        if args.skip_loop:
+            print(f"{size:>10} {len(fast_mesh):>10} {fast:>11.3f}s {'-':>12} {'-':>8}")
+            continue
+        slow, slow_mesh = best_of(lambda: build_mesh_loop(lons, lats, values), args.repeat)
+        assert np.array_equal(fast_mesh['vectors'], slow_mesh.vectors), 'vectorized mesh differs from the loop version'
+        print(f"{size:>10} {len(fast_mesh):>10} {fast:>11.3f}s {slow:>11.3f}s {slow / fast:>7.1f}x")
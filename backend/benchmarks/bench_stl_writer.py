@@ -0,0 +1,50 @@
+import argparse
+import gzip
+import io
+import os
+import sys
+from stl import mesh, Mode
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import terrain  # noqa: E402
+from bench_mesh import synthetic_points, best_of  # noqa: E402
+
+
+def numpy_stl_bytes(records, name, mode):
+    """Encodes the records with numpy-stl's Mesh.save, the writer the STL encoder replaces."""
+    reference = mesh.Mesh(records.copy(), calculate_normals=False, speedups=False)
+    buffer = io.BytesIO()
+    reference.save(name, fh=buffer, mode=mode)
+    return reference, buffer.getvalue()
+
+
+def validate(records, name='terrain.stl'):
+    """Checks that the encoder's binary and ASCII output is byte-identical to numpy-stl's."""
+    _, expected = numpy_stl_bytes(records, name, Mode.BINARY)
+    header = expected[:terrain.STL_HEADER_SIZE]  # numpy-stl stamps the current time into its header
+    actual = b''.join(terrain.iter_binary_stl(records.copy(), header=header, chunk_triangles=1000))
+    assert actual == expected, 'binary STL differs from numpy-stl'
+    assert len(actual) == terrain.binary_stl_size(len(records))
+
+    _, expected = numpy_stl_bytes(records, name, Mode.ASCII)
+    actual = terrain.mesh_to_bytes(records.copy(), name=name, ascii=True)
+    assert actual == expected, 'ASCII STL differs from numpy-stl'
+    assert gzip.decompress(terrain.mesh_to_bytes(records.copy(), name=name, ascii=True, compress=True)) == expected
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Validate and benchmark the STL encoder against numpy-stl')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000], help='Point counts to benchmark')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per size (best time is reported)')
+
+    args = parser.parse_args()
+    validate(terrain.build_mesh(*synthetic_points(2_000)))
+    print("Binary and ASCII output are byte-identical to numpy-stl")
+
+    print(f"{'points':>10} {'triangles':>10} {'encoder':>10} {'numpy-stl':>10} {'speedup':>8}")
+    for size in args.sizes:
+        records = terrain.build_mesh(*synthetic_points(size))
+        fast, _ = best_of(lambda: terrain.mesh_to_bytes(records), args.repeat)
+        slow, _ = best_of(lambda: numpy_stl_bytes(mesh.Mesh(records.copy()).data, 'terrain.stl', Mode.BINARY), args.repeat)
+        print(f"{size:>10} {len(records):>10} {fast:>9.3f}s {slow:>9.3f}s {slow / fast:>7.1f}x")
@@ -0,0 +1,317 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import synthetic  # noqa: E402
+
+# Benchmark groups, in the order they run. 'ingest' always runs first, since the others read its outputs.
+GROUPS = ('ingest', 'points', 'mesh', 'endpoints')
+
+# A result slower than this many times its baseline p50 is reported as a regression by --compare
+REGRESSION_RATIO = 1.2
+
+
+def peak_rss_mb():
+    """Returns the peak resident set size of this process so far, in MiB."""
+    # ru_maxrss survives exec on Linux (a spawned group would report its parent's peak), VmHWM does not
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(name, func, repeat, items=1, unit='runs/s', **params):
+    """Runs func repeat times and returns its timings: p50/p95/mean/min latency, throughput (items per
+    second at the p50 latency) and the peak RSS of the process afterwards.
+
+    func may return the number of items it processed, which then replaces items.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        processed = func()
+        times.append(time.perf_counter() - start)
+        if isinstance(processed, (int, np.integer)) and not isinstance(processed, bool):
+            items = int(processed)
+    p50 = float(np.percentile(times, 50))
+    return {
+        'name': name,
+        'params': params,
+        'runs': repeat,
+        'p50_ms': p50 * 1000,
+        'p95_ms': float(np.percentile(times, 95)) * 1000,
+        'mean_ms': float(np.mean(times)) * 1000,
+        'min_ms': min(times) * 1000,
+        'throughput': items / p50 if p50 > 0 else None,
+        'throughput_unit': unit,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def skipped(name, reason):
+    return {'name': name, 'skipped': reason}
+
+
+def swot_csv_files(data_dir):
+    """Returns the CSV paths of the ingested synthetic SWOT granules, oldest first."""
+    from datasets import SWOT
+    dataset = SWOT.with_directory(os.path.join(data_dir, SWOT.name))
+    with open(dataset.location_file, 'r') as f:
+        return [dataset.path(location['csv']) for location in json.load(f)]
+
+
+def bench_ingest(data_dir, options):
+    """Times converting every synthetic source of each dataset (what python -m ingest <dataset> runs)."""
+    import ingest
+    from datasets import SWOT, ELEVATION
+
+    results = []
+    for dataset in (SWOT, ELEVATION):
+        dataset = dataset.with_directory(os.path.join(data_dir, dataset.name))
+        name = f'convert {dataset.name}'
+        if dataset.source_format == 'tif':
+            try:
+                import osgeo.gdal  # noqa: F401
+            except ImportError:
+                results.append(skipped(name, 'GDAL (osgeo) is not installed'))
+                continue
+        results.append(measure(
+            name, lambda: ingest.ingest_dataset(dataset, force=True, workers=options['workers'])[0], options['repeat'],
+            unit='files/s', workers=options['workers'],
+        ))
+    return results
+
+
+def bench_points(data_dir, options):
+    """Times reading granule points: from the ingest CSVs, from their binary point files, and from one large CSV."""
+    import pointstore
+    from terrain import load_csv_data
+
+    csv_files = swot_csv_files(data_dir)
+    npy_files = [pointstore.points_path_for(path) for path in csv_files]
+    num_points = sum(pointstore.load_points(path).shape[1] for path in npy_files)
+
+    large_csv = os.path.join(data_dir, 'points.csv')
+    if not os.path.exists(large_csv):
+        synthetic.write_swot_csv(large_csv, options['points'], options['seed'])
+
+    return [
+        measure('load_csv_data granules', lambda: [load_csv_data(path) for path in csv_files], options['repeat'],
+                items=num_points, unit='points/s', granules=len(csv_files)),
+        measure('load_points granules', lambda: [np.asarray(pointstore.load_points(path)).sum() for path in npy_files],
+                options['repeat'], items=num_points, unit='points/s', granules=len(npy_files)),
+        measure('load_csv_data large', lambda: load_csv_data(large_csv), options['repeat'],
+                items=options['points'], unit='points/s', points=options['points']),
+    ]
+
+
+def stl_triangles(stl_bytes):
+    """Returns the number of triangles in a binary STL."""
+    return (len(stl_bytes) - 84) // 50
+
+
+def bench_mesh(data_dir, options):
+    """Times generate_stl around a point, over a box spanning overlapping granules and from the ingest grid."""
+    from terrain import generate_stl
+
+    csv_files = swot_csv_files(data_dir)
+    lng = synthetic.ORIGIN_LNG + synthetic.GRANULE_SPAN * 0.6
+    lat = synthetic.ORIGIN_LAT + synthetic.GRANULE_SPAN / 2
+    bbox = {'west': lng - 0.08, 'east': lng + 0.08, 'south': lat - 0.06, 'north': lat + 0.06}
+
+    def timed(name, **kwargs):
+        return measure(name, lambda: stl_triangles(generate_stl(csv_files, lng, lat, **kwargs)), options['repeat'],
+                       unit='triangles/s', **kwargs)
+
+    return [
+        timed('generate_stl point', radius=0.05),
+        timed('generate_stl point grid', radius=0.05, mode='grid'),
+        timed('generate_stl bbox latest', bbox=bbox, merge='latest'),
+        timed('generate_stl bbox mean', bbox=bbox, merge='mean'),
+    ]
+
+
+def tile_at(lng, lat, z):
+    """Returns the (x, y) of the web mercator tile containing the point at zoom z."""
+    n = 2 ** z
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2
+    return int((lng + 180) / 360 * n), int(y * n)
+
+
+def bench_endpoints(data_dir, options):
+    """Times the Flask endpoints of the SWOT layer through the test client, with the server reading data_dir."""
+    import logging
+    import server
+    logging.getLogger(server.__name__).setLevel(logging.WARNING)
+
+    # Serve every layer from the synthetic data instead of data/
+    for name, layer in server.layers.items():
+        server.layers[name] = server.Layer(layer.dataset.with_directory(os.path.join(data_dir, name)))
+    client = server.app.test_client()
+    layer = server.layers['swot']
+    requests = options['requests']
+    name = next(iter(layer.state.image_paths))
+    lng = synthetic.ORIGIN_LNG + synthetic.GRANULE_SPAN * 0.6
+    lat = synthetic.ORIGIN_LAT + synthetic.GRANULE_SPAN / 2
+    etag = client.get('/swot/get_json').headers['ETag']
+    zoom = 12
+    x, y = tile_at(lng, lat, zoom)
+    tiles = [(x + dx, y + dy) for dx in range(-2, 3) for dy in range(-2, 3)]
+    misses = iter(range(10 ** 6))
+
+    def call(method, url, expected_status, **kwargs):
+        # The url and request arguments may be functions, to vary them from request to request
+        def run():
+            arguments = {key: value() if callable(value) else value for key, value in kwargs.items()}
+            response = getattr(client, method)(url() if callable(url) else url, **arguments)
+            assert response.status_code == expected_status, f'{url}: {response.status_code} {response.get_data()[:200]}'
+            response.get_data()
+        return run
+
+    def endpoint(label, method, url, expected_status=200, **kwargs):
+        return measure(label, call(method, url, expected_status, **kwargs), requests, unit='requests/s')
+
+    tile_numbers = iter(range(10 ** 6))
+    return [
+        endpoint('GET get_json', 'get', '/swot/get_json'),
+        endpoint('GET get_json gzip', 'get', '/swot/get_json', headers={'Accept-Encoding': 'gzip'}),
+        endpoint('GET get_json 304', 'get', '/swot/get_json', 304, headers={'If-None-Match': etag}),
+        endpoint('GET get_json bbox', 'get', f'/swot/get_json?bbox={lng - 0.05},{lat - 0.05},{lng + 0.05},{lat + 0.05}&zoom=10'),
+        endpoint('GET get_json geojson', 'get', '/swot/get_json?format=geojson'),
+        endpoint('GET get_image', 'get', f'/swot/get_image?name={name}'),
+        endpoint('GET get_longitude_latitude', 'get', f'/swot/get_longitude_latitude?name={name}'),
+        endpoint('GET tiles', 'get', lambda: '/swot/tiles/{}/{}/{}.png'.format(zoom, *tiles[next(tile_numbers) % len(tiles)])),
+        # Every miss asks for a different point, so it is meshed; hits repeat the same point and come from the cache
+        endpoint('POST generate_stl miss', 'post', '/swot/generate_stl',
+                 json=lambda: {'lng': lng + next(misses) * 1e-3, 'lat': lat, 'radius': 0.05}),
+        endpoint('POST generate_stl hit', 'post', '/swot/generate_stl', json={'lng': lng, 'lat': lat, 'radius': 0.05}),
+    ]
+
+
+BENCHMARKS = {
+    'ingest': bench_ingest,
+    'points': bench_points,
+    'mesh': bench_mesh,
+    'endpoints': bench_endpoints,
+}
+
+
+def run_group(group, data_dir, options):
+    """Runs one benchmark group, in a fresh process unless options['isolate'] is off, so every group
+    reports its own peak RSS and starts with cold caches."""
+    if not options['isolate']:
+        return run_benchmarks(group, data_dir, options)
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(run_benchmarks, group, data_dir, options).result()
+
+
+def run_benchmarks(group, data_dir, options):
+    # The code under test prints progress and warnings; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        return BENCHMARKS[group](data_dir, options)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(data_dir, groups, options):
+    """Generates the synthetic inputs into data_dir (unless they are there already) and runs the benchmark groups."""
+    for dataset in (synthetic.SWOT, synthetic.ELEVATION):
+        directory = os.path.join(data_dir, dataset.name)
+        if not os.path.isdir(dataset.with_directory(directory).source_dir):
+            synthetic.generate_dataset(dataset, directory, options['size'], options['seed'])
+
+    results = []
+    for group in GROUPS:
+        if group in groups or (group == 'ingest' and not os.path.exists(os.path.join(data_dir, 'swot', 'locations.json'))):
+            print(f"Running {group} benchmarks...", file=sys.stderr)
+            results += [dict(result, group=group) for result in run_group(group, data_dir, options)]
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'options': options,
+        'results': results,
+    }
+
+
+def print_table(report, baseline=None, file=sys.stderr):
+    """Prints the results, and their p50 relative to the baseline report if one is given."""
+    baseline_p50 = {result['name']: result.get('p50_ms') for result in (baseline or {}).get('results', [])}
+    print(f"{'benchmark':<30} {'p50':>10} {'p95':>10} {'throughput':>22} {'peak RSS':>10} {'vs base':>8}", file=file)
+    for result in report['results']:
+        if 'skipped' in result:
+            print(f"{result['name']:<30} skipped: {result['skipped']}", file=file)
+            continue
+        throughput = f"{result['throughput']:,.1f} {result['throughput_unit']}" if result['throughput'] else '-'
+        ratio = '-'
+        if baseline_p50.get(result['name']):
+            change = result['p50_ms'] / baseline_p50[result['name']]
+            ratio = f"{change:.2f}x" + (' !' if change > REGRESSION_RATIO else '')
+        print(f"{result['name']:<30} {result['p50_ms']:>8.2f}ms {result['p95_ms']:>8.2f}ms {throughput:>22} "
+              f"{result['peak_rss_mb']:>8.1f}MB {ratio:>8}", file=file)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark ingest, point loading, meshing and the HTTP endpoints on synthetic data')
+    parser.add_argument('--size', choices=list(synthetic.SIZES), default=synthetic.DEFAULT_SIZE, help='Size of the synthetic inputs')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic inputs')
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS), help='Benchmark groups to run')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per benchmark')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint benchmark')
+    parser.add_argument('--points', type=int, default=200_000, help='Points in the large CSV read by load_csv_data')
+    parser.add_argument('--workers', type=int, default=1, help='Ingest worker processes')
+    parser.add_argument('--data-dir', help='Directory for the synthetic data (kept between runs); a temporary one by default')
+    parser.add_argument('--no-isolate', dest='isolate', action='store_false', help='Run every group in this process')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--compare', help='JSON report of an earlier run to compare the p50 latencies with')
+
+    args = parser.parse_args()
+    options = {key: getattr(args, key) for key in ('size', 'seed', 'repeat', 'requests', 'points', 'workers', 'isolate')}
+    if args.data_dir:
+        report = run_suite(os.path.abspath(args.data_dir), args.groups, options)
+    else:
+        with tempfile.TemporaryDirectory(prefix='bench-') as data_dir:
+            report = run_suite(data_dir, args.groups, options)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
@@ -0,0 +1,166 @@
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+from netCDF4 import Dataset as NetCDFFile
+from PIL import Image, TiffImagePlugin, TiffTags
+from pyproj import Transformer
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from datasets import SWOT, ELEVATION  # noqa: E402
+
+# Input sizes: number of granules/tiles per dataset and the raster shape (rows, columns) of each.
+# Ingest keeps every 10th cell, so a 1000x1000 raster becomes a 100x100 grid of points.
+SIZES = {
+    'small': {'granules': 2, 'nc_shape': (800, 800), 'tif_shape': (1000, 1000)},
+    'medium': {'granules': 4, 'nc_shape': (2000, 2000), 'tif_shape': (3000, 3000)},
+    'large': {'granules': 8, 'nc_shape': (4000, 4000), 'tif_shape': (6000, 6000)},
+}
+DEFAULT_SIZE = 'small'
+
+# Granules cover a patch of Lake Ontario and its shore (the area of the real data), each one shifted east by
+# half its width so neighbours overlap, and acquired GRANULE_INTERVAL apart
+ORIGIN_LNG, ORIGIN_LAT = -79.6, 43.5
+GRANULE_SPAN = 0.2  # Degrees
+FIRST_ACQUISITION = datetime(2024, 9, 27, 16, 48, 5)
+GRANULE_INTERVAL = timedelta(days=10, minutes=7)
+
+# SWOT marks dry cells with this fill value
+WSE_FILL_VALUE = -999999.0
+
+# DEM tiles are 30 m UTM zone 17 rasters (the CRS ingest_tif assumes), with this nodata value
+DEM_EPSG = 32617
+DEM_PIXEL_SIZE = 30.0
+DEM_NODATA = -9999.0
+
+# Rows generated at a time, so large rasters never have to fit in memory
+BLOCK_ROWS = 500
+
+TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def granule_name(number):
+    """Returns a SWOT-style granule name with the cycle, pass and acquisition times of the given granule."""
+    start = FIRST_ACQUISITION + number * GRANULE_INTERVAL
+    end = start + timedelta(seconds=21)
+    return (f"SWOT_L2_HR_Raster_100m_UTM17T_N_x_x_x_{number + 1:03d}_{number * 7 % 584:03d}_083F_"
+            f"{start.strftime(TIME_FORMAT)}_{end.strftime(TIME_FORMAT)}_PIC0_01")
+
+
+def relief(lons, lats):
+    """Smooth terrain (in metres) shared by the water surface and the DEM, so both look like the same place."""
+    return 75 + np.sin(lons * 60) * np.cos(lats * 45) * 2 + np.sin(lons * 7 + lats * 5) * 8
+
+
+def water_mask(lons, lats):
+    """True for wet cells: a meandering river and a few lakes (roughly half of every granule)."""
+    river = np.abs(lats - ORIGIN_LAT - GRANULE_SPAN / 2 - np.sin(lons * 40) * 0.03) < 0.04
+    lakes = np.sin(lons * 90) * np.sin(lats * 110) > 0.3
+    return river | lakes
+
+
+def write_swot_granule(path, number, shape, seed=0):
+    """Writes a SWOT-like raster granule: 2D longitude, latitude and wse variables, with dry cells filled."""
+    rng = np.random.default_rng([seed, number])
+    rows, cols = shape
+    west = ORIGIN_LNG + number * GRANULE_SPAN / 2
+    lng_step, lat_step = GRANULE_SPAN / cols, GRANULE_SPAN / rows
+
+    with NetCDFFile(path, 'w') as nc_file:
+        nc_file.createDimension('y', rows)
+        nc_file.createDimension('x', cols)
+        longitude = nc_file.createVariable('longitude', 'f8', ('y', 'x'))
+        latitude = nc_file.createVariable('latitude', 'f8', ('y', 'x'))
+        wse = nc_file.createVariable('wse', 'f4', ('y', 'x'), fill_value=WSE_FILL_VALUE)
+        wse.units = 'm'
+
+        for row_start in range(0, rows, BLOCK_ROWS):
+            row_stop = min(row_start + BLOCK_ROWS, rows)
+            i = np.arange(row_start, row_stop)[:, np.newaxis]
+            j = np.arange(cols)[np.newaxis, :]
+            # A slight shear, like a UTM raster seen in lon/lat
+            lons = west + j * lng_step + i * lng_step * 0.01
+            lats = ORIGIN_LAT + i * lat_step + np.zeros_like(lons)
+            values = relief(lons, lats) + rng.normal(0, 0.05, lons.shape)
+            longitude[row_start:row_stop] = lons
+            latitude[row_start:row_stop] = lats
+            wse[row_start:row_stop] = np.ma.masked_where(~water_mask(lons, lats), values)
+
+
+def geotiff_tags(x_origin, y_origin):
+    """Returns the GeoTIFF tags of a north-up UTM raster whose top-left corner is at (x_origin, y_origin)."""
+    tags = TiffImagePlugin.ImageFileDirectory_v2()
+    tags[33550] = (DEM_PIXEL_SIZE, DEM_PIXEL_SIZE, 0.0)  # ModelPixelScale
+    tags.tagtype[33550] = TiffTags.DOUBLE
+    tags[33922] = (0.0, 0.0, 0.0, x_origin, y_origin, 0.0)  # ModelTiepoint
+    tags.tagtype[33922] = TiffTags.DOUBLE
+    # GeoKeyDirectory: projected model, pixel-is-area, the EPSG code of the CRS, metres
+    tags[34735] = (1, 1, 0, 4, 1024, 0, 1, 1, 1025, 0, 1, 1, 3072, 0, 1, DEM_EPSG, 3076, 0, 1, 9001)
+    tags.tagtype[34735] = TiffTags.SHORT
+    tags[42113] = str(int(DEM_NODATA))  # GDAL_NODATA
+    tags.tagtype[42113] = TiffTags.ASCII
+    return tags
+
+
+def write_dem_tile(path, number, shape, seed=0):
+    """Writes a DEM-like float32 GeoTIFF in UTM zone 17, with nodata over the lakes and the river."""
+    rng = np.random.default_rng([seed, number])
+    rows, cols = shape
+    to_utm = Transformer.from_crs('EPSG:4326', f'EPSG:{DEM_EPSG}', always_xy=True)
+    to_lnglat = Transformer.from_crs(f'EPSG:{DEM_EPSG}', 'EPSG:4326', always_xy=True)
+    x_origin, y_origin = to_utm.transform(ORIGIN_LNG + number * GRANULE_SPAN / 2, ORIGIN_LAT + GRANULE_SPAN)
+
+    elevation = np.empty(shape, dtype=np.float32)
+    for row_start in range(0, rows, BLOCK_ROWS):
+        row_stop = min(row_start + BLOCK_ROWS, rows)
+        y = y_origin - (np.arange(row_start, row_stop)[:, np.newaxis] + 0.5) * DEM_PIXEL_SIZE
+        x = x_origin + (np.arange(cols)[np.newaxis, :] + 0.5) * DEM_PIXEL_SIZE
+        lons, lats = to_lnglat.transform(*np.broadcast_arrays(x, y))
+        block = relief(lons, lats) + 20 + rng.normal(0, 0.5, lons.shape)
+        block[water_mask(lons, lats)] = DEM_NODATA
+        elevation[row_start:row_stop] = block
+
+    Image.fromarray(elevation, 'F').save(path, tiffinfo=geotiff_tags(x_origin, y_origin))
+
+
+def generate_dataset(dataset, directory, size=DEFAULT_SIZE, seed=0):
+    """Writes the synthetic source files of a dataset (SWOT NetCDF granules or DEM GeoTIFFs) into
+    directory/<source format> and returns the dataset pointed at directory.
+
+    The same size and seed always produce the same files.
+    """
+    dataset = dataset.with_directory(directory)
+    os.makedirs(dataset.source_dir, exist_ok=True)
+    config = SIZES[size]
+    for number in range(config['granules']):
+        if dataset.source_format == 'nc':
+            write_swot_granule(os.path.join(dataset.source_dir, granule_name(number) + '.nc'), number, config['nc_shape'], seed)
+        else:
+            write_dem_tile(os.path.join(dataset.source_dir, f"dem_{number:03d}.tif"), number, config['tif_shape'], seed)
+    return dataset
+
+
+def write_swot_csv(path, num_points, seed=0):
+    """Writes a SWOT-like point CSV (the format ingest produces) with num_points scattered points."""
+    rng = np.random.default_rng(seed)
+    lons = ORIGIN_LNG + rng.random(num_points) * GRANULE_SPAN
+    lats = ORIGIN_LAT + rng.random(num_points) * GRANULE_SPAN
+    values = relief(lons, lats) + rng.normal(0, 0.05, num_points)
+    np.savetxt(
+        path, np.column_stack((lons, lats, values)), fmt=['%.10f', '%.10f', '%.9g'], delimiter=',',
+        header=','.join(SWOT.columns), comments=''
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write synthetic SWOT NetCDF granules and DEM GeoTIFFs for benchmarking')
+    parser.add_argument('directory', help='Directory the datasets are written to (one subdirectory per dataset)')
+    parser.add_argument('--size', choices=list(SIZES), default=DEFAULT_SIZE, help='Number and size of the generated files')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (the same seed always writes the same files)')
+
+    args = parser.parse_args()
+    for source in (SWOT, ELEVATION):
+        generated = generate_dataset(source, os.path.join(args.directory, source.name), args.size, args.seed)
+        print(f"Wrote {SIZES[args.size]['granules']} {source.description} to '{generated.source_dir}'")
@@ -0,0 +1,144 @@
+import base64
+import bisect
+import json
+import math
+import os
+from datetime import datetime
+from spatial import FootprintIndex
+from terrain import granule_time
+from tiles import TILE_SIZE, mercator_y
+
+# Most granules a location query returns per page
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+# At a given zoom, granules whose footprint would be drawn smaller than this many pixels are left out
+MIN_FOOTPRINT_PIXELS = 2
+
+# Granule times are compared as strings in this format (the one used in granule file names)
+TIME_FORMAT = '%Y%m%dT%H%M%S'
+
+
+class QueryError(ValueError):
+    """Raised when a location query parameter (bbox, zoom, limit, cursor, start or end) is invalid."""
+
+
+def granule_name(location):
+    """Returns the key a granule is looked up and ordered by: the name of its image without the extension."""
+    return os.path.splitext(os.path.basename(location['image']))[0]
+
+
+def parse_time(value, end_of_day=False):
+    """Parses an ISO 8601 date or time (e.g. '2024-09-27' or '2024-09-27T16:48:05') into TIME_FORMAT.
+
+    With end_of_day a bare date means its last second, so date ranges include their end date.
+    """
+    try:
+        parsed = datetime.fromisoformat(value)
+        if end_of_day and 'T' not in value and ' ' not in value:
+            parsed = parsed.replace(hour=23, minute=59, second=59)
+        return parsed.strftime(TIME_FORMAT)
+    except ValueError:
+        raise QueryError(f"Invalid date '{value}'. Expected an ISO 8601 date or time such as 2024-09-27")
+
+
+def parse_bbox(value):
+    """Parses 'west,south,east,north' (Leaflet's LatLngBounds.toBBoxString) into a bounding box dict."""
+    try:
+        west, south, east, north = (float(part) for part in value.split(','))
+    except ValueError:
+        raise QueryError("bbox must be four numbers: west,south,east,north")
+    if not (west <= east and south <= north):
+        raise QueryError("bbox must have west <= east and south <= north")
+    return {'west': west, 'east': east, 'south': south, 'north': north}
+
+
+def encode_cursor(name):
+    return base64.urlsafe_b64encode(name.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        return base64.b64decode(cursor.encode('ascii'), altchars=b'-_', validate=True).decode('utf-8')
+    except (ValueError, UnicodeError):
+        raise QueryError("Invalid cursor")
+
+
+def footprint_pixels(location, zoom):
+    """Returns the larger side, in screen pixels at the given zoom, of a granule's footprint."""
+    southwest, northeast = location['bounding_box']['southwest'], location['bounding_box']['northeast']
+    world = TILE_SIZE * 2 ** zoom
+    width = (northeast['lng'] - southwest['lng']) / 360.0 * world
+    height = (mercator_y(northeast['lat']) - mercator_y(southwest['lat'])) / (2 * math.pi) * world
+    return max(width, float(height))
+
+
+class Catalog:
+    """Answers location queries over one layer's granules: filtered by footprint (bbox), by the smallest
+    footprint still visible at a zoom, and by the acquisition time in their names, in pages.
+
+    Results are always ordered by granule name, and cursors name the last granule of a page, so paging
+    stays stable when locations.json is reloaded in between.
+    """
+
+    def __init__(self, locations):
+        self.locations = [location for location in locations if location.get('image')]
+        self.index = FootprintIndex(self.locations)
+        self.names = [granule_name(location) for location in self.locations]
+        self.times = [granule_time(name) for name in self.names]
+        self._order = sorted(range(len(self.locations)), key=lambda i: self.names[i])
+        self._sorted_names = [self.names[i] for i in self._order]
+        self._rank = {id(self.locations[i]): rank for rank, i in enumerate(self._order)}
+
+    def query(self, bbox=None, zoom=None, start=None, end=None, cursor=None, limit=DEFAULT_LIMIT):
+        """Returns (page of locations, cursor of the next page or None)."""
+        if bbox is not None:
+            ranks = sorted(self._rank[id(location)] for location in self.index.intersecting(bbox))
+        else:
+            ranks = range(len(self._order))
+        if cursor is not None:
+            # Keyset pagination: continue after the last name of the previous page
+            first = bisect.bisect_right(self._sorted_names, decode_cursor(cursor))
+            ranks = ranks[bisect.bisect_left(ranks, first):]
+
+        page = []
+        for rank in ranks:
+            i = self._order[rank]
+            location = self.locations[i]
+            if start is not None and not (self.times[i] and self.times[i] >= start):
+                continue
+            if end is not None and not (self.times[i] and self.times[i] <= end):
+                continue
+            if zoom is not None and footprint_pixels(location, zoom) < MIN_FOOTPRINT_PIXELS:
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(granule_name(page[-1]))
+            page.append(location)
+        return page, None
+
+
+def feature(location):
+    """Returns a granule as a GeoJSON Feature with its footprint as the geometry."""
+    southwest, northeast = location['bounding_box']['southwest'], location['bounding_box']['northeast']
+    west, south, east, north = southwest['lng'], southwest['lat'], northeast['lng'], northeast['lat']
+    return {
+        'type': 'Feature',
+        'id': granule_name(location),
+        'bbox': [west, south, east, north],
+        'geometry': {
+            'type': 'Polygon',
+            'coordinates': [[[west, south], [east, south], [east, north], [west, north], [west, south]]],
+        },
+        'properties': {key: value for key, value in location.items() if key != 'bounding_box'},
+    }
+
+
+def iter_geojson(locations, next_cursor=None):
+    """Yields a GeoJSON FeatureCollection of the granules, one feature at a time.
+
+    next_cursor is added as a foreign member so clients can page through GeoJSON results too.
+    """
+    yield '{"type":"FeatureCollection","features":['
+    for number, location in enumerate(locations):
+        yield (',' if number else '') + json.dumps(feature(location), separators=(',', ':'))
+    yield '],"next_cursor":' + json.dumps(next_cursor) + '}\n'
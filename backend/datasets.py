@@ -0,0 +1,85 @@
+import os
+from collections import OrderedDict
+from terrain import SWOT_COLUMNS, ELEVATION_COLUMNS, WATER_LEVEL_COLUMNS
+
+# Every dataset lives in its own directory under data/, named after the dataset
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Source formats that ingest can convert, and the module that converts each (see ingest.py)
+SOURCE_FORMATS = {
+    'nc': 'ingest_nc',  # SWOT NetCDF rasters (netCDF4)
+    'tif': 'ingest_tif',  # UTM GeoTIFFs (GDAL)
+}
+
+
+class Dataset:
+    """Describes one data layer: where its files live, which CSV columns hold its points, the units of its
+    values and the format of its source files.
+
+    The server routes, STL generation and ingest of every layer are all built from these descriptions.
+    """
+
+    def __init__(self, name, columns, value_units, source_format, stl_name, description, directory=None, time_series=False):
+        if source_format not in SOURCE_FORMATS:
+            raise ValueError(f"Unknown source format '{source_format}'. Expected one of: {', '.join(SOURCE_FORMATS)}")
+        self.name = name  # URL prefix of the layer's endpoints and name of its directory under data/
+        self.columns = columns  # (longitude, latitude, value) CSV column names
+        self.value_units = value_units  # None for unitless values
+        self.source_format = source_format
+        self.stl_name = stl_name  # Download name of the layer's STLs
+        self.description = description
+        self.directory = directory or os.path.join(DATA_DIR, name)
+        self.time_series = time_series  # Granule names carry the pass and acquisition time, so /timeseries is served
+
+    def __repr__(self):
+        return f"Dataset({self.name!r})"
+
+    def path(self, *parts):
+        """Returns a path inside the dataset directory."""
+        return os.path.join(self.directory, *parts)
+
+    @property
+    def source_dir(self):
+        return self.path(self.source_format)
+
+    @property
+    def location_file(self):
+        return self.path('locations.json')
+
+    def with_directory(self, directory):
+        """Returns the same dataset reading and writing its files in another directory."""
+        return Dataset(
+            self.name, self.columns, self.value_units, self.source_format, self.stl_name, self.description, directory, self.time_series
+        )
+
+
+# Registered datasets, in the order their layers are listed
+DATASETS = OrderedDict()
+
+
+def register(dataset):
+    """Adds a dataset to the registry and returns it."""
+    if dataset.name in DATASETS:
+        raise ValueError(f"Dataset '{dataset.name}' is already registered")
+    DATASETS[dataset.name] = dataset
+    return dataset
+
+
+def get_dataset(name):
+    """Returns the registered dataset with the given name, or raises KeyError."""
+    try:
+        return DATASETS[name]
+    except KeyError:
+        raise KeyError(f"Unknown dataset '{name}'. Expected one of: {', '.join(DATASETS)}")
+
+
+ELEVATION = register(Dataset(
+    'elevation', ELEVATION_COLUMNS, 'm', 'tif', 'elevation_terrain.stl', 'DEM elevation GeoTIFFs',
+))
+WATER_LEVEL = register(Dataset(
+    # DSWx water classes are unitless
+    'water-level', WATER_LEVEL_COLUMNS, None, 'tif', 'water_level_terrain.stl', 'Water-level GeoTIFFs',
+))
+SWOT = register(Dataset(
+    'swot', SWOT_COLUMNS, 'm', 'nc', 'terrain.stl', 'SWOT NetCDF granules', time_series=True,
+))
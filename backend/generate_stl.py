@@ -0,0 +1,47 @@
+import argparse
+import os
+import sys
+import tempfile
+from datasets import DATASETS, get_dataset
+from terrain import generate_stl, TerrainError
+
+
+def write_stl_atomic(path, stl_bytes):
+    # Write to a private temporary file and rename it into place, so concurrent runs
+    # targeting the same path never read or interleave a partially written STL
+    output_dir = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix='.stl.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(stl_bytes)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def main():
+    """Command line entry point: generates an STL from CSV files of one dataset, e.g.
+    python generate_stl.py swot --csv_files data/swot/csv/NAME.csv --lng -79.4 --lat 43.6 --output_stl out.stl
+    """
+    parser = argparse.ArgumentParser(description='Generate 3D printable STL from CSV')
+    parser.add_argument('dataset', choices=list(DATASETS), help='Dataset the CSV files belong to')
+    parser.add_argument('--csv_files', type=str, nargs='+', required=True, help='List of CSV files')
+    parser.add_argument('--lng', type=float, required=True, help='Longitude of the point')
+    parser.add_argument('--lat', type=float, required=True, help='Latitude of the point')
+    parser.add_argument('--output_stl', type=str, required=True, help='Output STL file name')
+
+    args = parser.parse_args()
+    dataset = get_dataset(args.dataset)
+    try:
+        stl_bytes = generate_stl(args.csv_files, args.lng, args.lat, columns=dataset.columns)
+    except TerrainError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    write_stl_atomic(args.output_stl, stl_bytes)
+    print(f"STL file saved to {args.output_stl}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+# gunicorn settings for the production server: gunicorn -c gunicorn.conf.py
+# Everything is configured through the WEB_* environment variables read in wsgi.py; set WEB_WORKERS rather
+# than passing --workers, so the per-worker cache budgets are split over the right number of workers.
+from wsgi import WEB_BIND, WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, WEB_GRACEFUL_TIMEOUT
+
+wsgi_app = 'wsgi:create_app()'
+bind = WEB_BIND
+workers = WEB_WORKERS
+threads = WEB_THREADS
+worker_class = 'gthread'
+timeout = WEB_TIMEOUT
+graceful_timeout = WEB_GRACEFUL_TIMEOUT
+
+# Load the data once in the master and fork the workers from it, so they share it copy-on-write
+preload_app = True
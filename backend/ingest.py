@@ -0,0 +1,203 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pointstore
+import timing
+from datasets import DATASETS, SOURCE_FORMATS, get_dataset
+
+MANIFEST_FILENAME = 'manifest.json'
+
+# Directories every dataset's outputs are written to
+OUTPUT_DIRS = ('csv', 'png', pointstore.POINTS_DIR, pointstore.GRID_DIR)
+
+
+def write_json_atomic(path, data, indent=4):
+    """Writes JSON to a temporary file and renames it over path, so readers never see a partial file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.json.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=indent)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def file_digest(path, block_size=1024 * 1024):
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """Persistent record of every ingested source file (size, mtime, content hash), its outputs and its
+    locations.json entry, so that re-runs only convert new or changed sources.
+
+    Paths are stored relative to the dataset directory.
+    """
+
+    def __init__(self, base_dir, filename=MANIFEST_FILENAME):
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, filename)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f).get('sources', {})
+        self._digests = {}
+
+    def _relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.base_dir)
+
+    def _digest(self, source_path, stat):
+        # Hash each source at most once per run
+        key = (source_path, stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(source_path)
+        return self._digests[key]
+
+    def needs_update(self, source_path, force=False):
+        """Returns True if the source is new, has changed, or is missing one of its outputs."""
+        entry = self.entries.get(self._relative(source_path))
+        if force or entry is None:
+            return True
+        if any(not os.path.exists(os.path.join(self.base_dir, output)) for output in entry['outputs']):
+            return True
+
+        stat = os.stat(source_path)
+        if stat.st_size != entry['size']:
+            return True
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return False
+
+        # Touched but possibly unchanged: fall back to the content hash
+        if self._digest(source_path, stat) != entry['sha256']:
+            return True
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return False
+
+    def record(self, source_path, location, outputs):
+        """Records a successfully converted source together with its outputs and locations.json entry."""
+        stat = os.stat(source_path)
+        self.entries[self._relative(source_path)] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': self._digest(source_path, stat),
+            'outputs': [self._relative(output) for output in outputs],
+            'location': location,
+        }
+
+    def forget(self, source_path):
+        """Drops a source from the manifest (e.g. after a failed conversion) so the next run retries it."""
+        self.entries.pop(self._relative(source_path), None)
+
+    def prune(self, source_paths):
+        """Forgets every source that is not in source_paths (e.g. deleted inputs) and returns their names."""
+        keep = {self._relative(path) for path in source_paths}
+        removed = [name for name in self.entries if name not in keep]
+        for name in removed:
+            del self.entries[name]
+        return removed
+
+    def locations(self):
+        """Returns the locations.json entries of every recorded source, ordered by source name."""
+        return [self.entries[name]['location'] for name in sorted(self.entries)]
+
+    def save(self):
+        write_json_atomic(self.path, {'sources': self.entries}, indent=2)
+
+
+def update_locations(manifest, location_file):
+    """Rewrites locations.json atomically from the manifest."""
+    write_json_atomic(location_file, manifest.locations())
+
+
+def convert_source(dataset, filename):
+    """Converts one source file (in a worker process) and returns its locations.json entry, or None if it
+    could not be converted, together with the stage spans timed while converting it."""
+    converter = importlib.import_module(SOURCE_FORMATS[dataset.source_format])
+    with timing.collect() as spans:
+        location = converter.convert(dataset, filename)
+    return location, spans
+
+
+def ingest_dataset(dataset, force=False, workers=None):
+    """Converts the new or changed source files of a dataset (everything with force) and rewrites its locations.json.
+
+    Sources are converted in parallel by the converter of the dataset's source format (see datasets.SOURCE_FORMATS),
+    and the time each conversion stage took is recorded here (see timing.py). A source that fails to convert is
+    reported and left out of the manifest, so the next run retries it; the others are kept, even if the run is
+    interrupted. Returns (number converted, number of sources, names of the sources that failed).
+    """
+    # Fails early, before any worker starts, if the converter's dependencies are missing
+    importlib.import_module(SOURCE_FORMATS[dataset.source_format])
+
+    # Create output directories if they don't exist
+    for dir_name in OUTPUT_DIRS:
+        os.makedirs(dataset.path(dir_name), exist_ok=True)
+
+    # Only convert source files that are new or changed since the last run (or everything with force)
+    manifest = IngestManifest(dataset.directory)
+    extension = '.' + dataset.source_format
+    filenames = [filename for filename in os.listdir(dataset.source_dir) if filename.endswith(extension)]
+    manifest.prune([os.path.join(dataset.source_dir, filename) for filename in filenames])
+    pending = [filename for filename in filenames if manifest.needs_update(os.path.join(dataset.source_dir, filename), force=force)]
+
+    failed = []
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, workers or os.cpu_count() or 1)) as executor:
+            futures = {executor.submit(convert_source, dataset, filename): filename for filename in pending}
+            for future in as_completed(futures):
+                filename = futures[future]
+                source_path = os.path.join(dataset.source_dir, filename)
+                try:
+                    image_info, spans = future.result()
+                except Exception as e:
+                    print(f"Error converting {filename}: {e!r}")
+                    image_info, spans = None, []
+                timing.record_all(spans)
+                if image_info is None:
+                    manifest.forget(source_path)
+                    failed.append(filename)
+                    continue
+                outputs = [dataset.path(image_info[key]) for key in ('csv', 'npy', 'grid', 'image')]
+                outputs += [dataset.path(level[key]) for level in image_info['levels'] for key in ('npy', 'image')]
+                manifest.record(source_path, image_info, outputs)
+    finally:
+        # Merge the results so far into the manifest and rewrite locations.json from it atomically
+        manifest.save()
+        update_locations(manifest, dataset.location_file)
+    return len(pending) - len(failed), len(filenames), sorted(failed)
+
+
+def main():
+    """Command line entry point: ingests one dataset, e.g. python -m ingest swot (run from backend/)."""
+    parser = argparse.ArgumentParser(description='Convert source files into CSVs, binary point files, grids, PNGs and locations.json')
+    parser.add_argument('dataset', choices=list(DATASETS), help='Dataset to ingest')
+    parser.add_argument('--force', action='store_true', help='Re-convert every file, even ones that have not changed')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of files converted in parallel')
+    args = parser.parse_args()
+
+    dataset = get_dataset(args.dataset)
+    with timing.collect() as spans:
+        converted, total, failed = ingest_dataset(dataset, force=args.force, workers=args.workers)
+
+    print(f"Converted {converted} new or changed of {total} {dataset.description}.")
+    for stage, (seconds, count) in timing.summarize(spans).items():
+        print(f"  {stage}: {seconds:.2f}s over {count} file(s)")
+    print(f"Conversion complete. Outputs saved under '{dataset.directory}', and 'locations.json' created at '{dataset.location_file}'.")
+    if failed:
+        print(f"Failed to convert {len(failed)} file(s), which the next run retries: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+import matplotlib.image as mpimg
+from matplotlib import colormaps
+from netCDF4 import Dataset as NetCDFFile
+from numpy.ma import masked_invalid
+import pointstore
+import pyramid
+from timing import span
+
+# Downsample the data for faster processing
+downsample_factor = 10  # Adjust this number to balance speed vs quality
+
+# Number of downsampled rows read from the NetCDF variables at a time (keeps memory bounded)
+chunk_rows = 256
+
+# Colormap used to render the water surface elevation PNGs
+colormap = 'viridis'
+
+
+def read_downsampled(variable):
+    """Reads every downsample_factor-th cell of a 2D NetCDF variable in row windows, masking invalid values."""
+    num_rows = variable.shape[0]
+    rows_per_chunk = chunk_rows * downsample_factor
+    chunks = [
+        masked_invalid(variable[row_start:row_start + rows_per_chunk:downsample_factor, ::downsample_factor])
+        for row_start in range(0, num_rows, rows_per_chunk)
+    ]
+    return np.ma.concatenate(chunks)
+
+
+def render_png(png_path, water_surface_elevation, low=None, high=None):
+    """Writes the water surface elevation as a colormapped RGBA PNG (masked cells are transparent).
+
+    The colormap spans low..high, which default to the range of the data.
+    """
+    mask = np.ma.getmaskarray(water_surface_elevation)
+    if low is None or high is None:
+        low, high = np.min(water_surface_elevation), np.max(water_surface_elevation)
+    values = water_surface_elevation.filled(low)
+    normalized = (values - low) / (high - low) if high > low else np.zeros(values.shape)
+
+    rgba = colormaps[colormap](normalized, bytes=True)
+    rgba[mask] = 0
+
+    # Row 0 is the southernmost row, so flip it to the bottom of the image (imshow origin='lower')
+    mpimg.imsave(png_path, rgba[::-1])
+
+
+def convert(dataset, filename):
+    """Converts one NetCDF granule of a dataset into its CSV, binary point file, grid and PNGs, and returns its locations.json entry."""
+    name = filename.replace('.nc', '')
+    nc_path = os.path.join(dataset.source_dir, filename)
+    png_path = dataset.path('png', f"{name}.png")
+    csv_path = dataset.path('csv', f"{name}.csv")
+    npy_path = dataset.path(pointstore.POINTS_DIR, f"{name}{pointstore.POINTS_EXT}")
+    grid_path = dataset.path(pointstore.GRID_DIR, f"{name}{pointstore.POINTS_EXT}")
+
+    # Open the NetCDF file
+    with span('ingest.read'):
+        nc_file = NetCDFFile(nc_path, 'r')
+
+        try:
+            # Read the downsampled variables window by window; invalid data (very large or NaN values) is masked
+            longitudes_downsampled = read_downsampled(nc_file.variables['longitude'])
+            latitudes_downsampled = read_downsampled(nc_file.variables['latitude'])
+            water_surface_elevation_downsampled = read_downsampled(nc_file.variables['wse'])
+        except KeyError as e:
+            print(f"Error reading variables from {filename}: {e}")
+            return None
+        finally:
+            # Close the NetCDF file
+            nc_file.close()
+
+    # Only keep valid (non-masked) cells
+    valid = ~(
+        np.ma.getmaskarray(water_surface_elevation_downsampled) |
+        np.ma.getmaskarray(longitudes_downsampled) |
+        np.ma.getmaskarray(latitudes_downsampled)
+    )
+    lons = np.ma.getdata(longitudes_downsampled)[valid]
+    lats = np.ma.getdata(latitudes_downsampled)[valid]
+    water_levels = np.ma.getdata(water_surface_elevation_downsampled)[valid]
+
+    # Write the CSV in one bulk call
+    with span('ingest.csv'):
+        np.savetxt(
+            csv_path,
+            np.column_stack((lons, lats, water_levels)),
+            fmt=['%.10f', '%.10f', '%.9g'],
+            delimiter=',',
+            header=','.join(dataset.columns),
+            comments=''
+        )
+
+    # Save the same points as a binary columnar file for fast memory-mapped loading
+    with span('ingest.points'):
+        pointstore.write_points(npy_path, lons, lats, water_levels)
+
+    # Keep the downsampled grid too, so STLs can be meshed cell by cell without triangulating
+    with span('ingest.grid'):
+        pointstore.write_grid(grid_path, longitudes_downsampled, latitudes_downsampled, water_surface_elevation_downsampled)
+
+    with span('ingest.png'):
+        render_png(png_path, water_surface_elevation_downsampled)
+
+    # Overview pyramid: points merged over 2x2, 4x4, ... blocks of the grid, and matching PNGs on the same colour scale
+    rows, cols = np.nonzero(valid)
+    low, high = np.min(water_surface_elevation_downsampled), np.max(water_surface_elevation_downsampled)
+    levels = []
+    with span('ingest.pyramid'):
+        for factor, level_npy_path, num_points in pyramid.write_point_levels(npy_path, rows, cols, lons, lats, water_levels):
+            render_png(pyramid.level_path(png_path, factor), pyramid.downsample_grid(water_surface_elevation_downsampled, factor), low, high)
+            levels.append({
+                "factor": factor,
+                "npy": f"./{pointstore.POINTS_DIR}/{os.path.basename(level_npy_path)}",
+                "image": f"./png/{os.path.basename(pyramid.level_path(png_path, factor))}",
+                "points": num_points
+            })
+
+    # Create a dictionary for the image and bounding box info
+    return {
+        "name": name,
+        "csv": f"./csv/{name}.csv",
+        "npy": f"./{pointstore.POINTS_DIR}/{name}{pointstore.POINTS_EXT}",
+        "grid": f"./{pointstore.GRID_DIR}/{name}{pointstore.POINTS_EXT}",
+        "image": f"./png/{name}.png",
+        "nc": f"./nc/{name}.nc",
+        "levels": levels,
+        "bounding_box": {
+            "southwest": {
+                "lat": float(np.min(latitudes_downsampled)),
+                "lng": float(np.min(longitudes_downsampled))
+            },
+            "northeast": {
+                "lat": float(np.max(latitudes_downsampled)),
+                "lng": float(np.max(longitudes_downsampled))
+            }
+        }
+    }
@@ -0,0 +1,149 @@
+import os
+import numpy as np
+from osgeo import gdal
+from pyproj import CRS, Transformer
+import pointstore
+import pyramid
+from timing import span
+
+# Define resolution reduction factor (increase this to reduce the number of points)
+sampling_interval = 10  # Process every 10th pixel (can be adjusted for more or less detail)
+
+# Number of sampled rows read from the band at a time (keeps memory bounded for large tiles)
+block_rows = 256
+
+# UTM to Lat/Lng conversion (adjust UTM zone accordingly)
+utm_crs = CRS(proj='utm', zone=17, datum='WGS84')  # UTM zone should match your data
+wgs84_crs = CRS(proj='latlong', datum='WGS84')
+
+
+def sample_band(ds, band, transformer):
+    """Reads every sampling_interval-th pixel of the band in row blocks.
+
+    Returns the row/column of each valid sample on the sampling grid and its lon/lat/value arrays.
+    """
+    geo_transform = ds.GetGeoTransform()
+    x_res = ds.RasterXSize
+    y_res = ds.RasterYSize
+    no_data_value = band.GetNoDataValue()
+
+    rows, cols, lons, lats, values = [], [], [], [], []
+    rows_per_block = block_rows * sampling_interval
+    for row_start in range(0, y_res, rows_per_block):
+        num_rows = min(rows_per_block, y_res - row_start)
+        block = band.ReadAsArray(0, row_start, x_res, num_rows)[::sampling_interval, ::sampling_interval]
+
+        # Pixel indices of the sampled cells in this block
+        i = np.arange(row_start, row_start + num_rows, sampling_interval)[:, np.newaxis]
+        j = np.arange(0, x_res, sampling_interval)[np.newaxis, :]
+
+        valid = np.ones(block.shape, dtype=bool) if no_data_value is None else block != no_data_value
+        i, j = np.broadcast_to(i, block.shape)[valid], np.broadcast_to(j, block.shape)[valid]
+
+        x_coord = geo_transform[0] + j * geo_transform[1] + i * geo_transform[2]
+        y_coord = geo_transform[3] + j * geo_transform[4] + i * geo_transform[5]
+        lon, lat = transformer.transform(x_coord, y_coord)
+
+        rows.append(i // sampling_interval)
+        cols.append(j // sampling_interval)
+        lons.append(lon)
+        lats.append(lat)
+        values.append(block[valid])
+
+    return tuple(np.concatenate(column) for column in (rows, cols, lons, lats, values))
+
+
+def convert(dataset, filename):
+    """Converts one TIF of a dataset into its CSV, binary point file, grid and PNGs, and returns its locations.json entry."""
+    base_name = filename[:-4]  # Remove '.tif' extension
+    tif_path = os.path.join(dataset.source_dir, filename)
+    png_path = dataset.path('png', base_name + '.png')
+    csv_path = dataset.path('csv', base_name + '.csv')
+    npy_path = dataset.path(pointstore.POINTS_DIR, base_name + pointstore.POINTS_EXT)
+    grid_path = dataset.path(pointstore.GRID_DIR, base_name + pointstore.POINTS_EXT)
+
+    transformer = Transformer.from_crs(utm_crs, wgs84_crs, always_xy=True)
+
+    # Open the TIF file using GDAL
+    ds = gdal.Open(tif_path)
+    band = ds.GetRasterBand(1)
+    geo_transform = ds.GetGeoTransform()  # Renamed to geo_transform
+
+    # Get the georeference information (bounding box in UTM)
+    minx = geo_transform[0]
+    maxy = geo_transform[3]
+    maxx = minx + geo_transform[1] * ds.RasterXSize
+    miny = maxy + geo_transform[5] * ds.RasterYSize
+
+    # Convert the bounding box from UTM to lat/lng
+    (minx_lon, maxx_lon), (miny_lat, maxy_lat) = transformer.transform([minx, maxx], [miny, maxy])
+
+    # Debugging: Print the converted coordinates
+    print(f"Bounding Box for {filename}:")
+    print(f"Southwest (lat, lng): ({miny_lat}, {minx_lon})")
+    print(f"Northeast (lat, lng): ({maxy_lat}, {maxx_lon})")
+
+    # Generate the CSV file with longitude, latitude, and value in one bulk write
+    with span('ingest.read'):
+        rows, cols, lons, lats, values = sample_band(ds, band, transformer)
+    value_format = '%d' if np.issubdtype(values.dtype, np.integer) else '%.9g'
+    with span('ingest.csv'):
+        np.savetxt(
+            csv_path,
+            np.column_stack((lons, lats, values)),
+            fmt=['%.10f', '%.10f', value_format],
+            delimiter=',',
+            header=','.join(dataset.columns),
+            comments=''
+        )
+
+    # Save the points as a binary columnar file for fast memory-mapped loading
+    with span('ingest.points'):
+        pointstore.write_points(npy_path, lons, lats, values)
+
+    # Keep the sampling grid too (nodata cells are NaN), so STLs can be meshed cell by cell without triangulating
+    grid_shape = (-(-ds.RasterYSize // sampling_interval), -(-ds.RasterXSize // sampling_interval))
+    with span('ingest.grid'):
+        pointstore.write_grid(grid_path, *pointstore.points_to_grid(grid_shape, rows, cols, lons, lats, values))
+
+    # Use GDAL to convert the .tif to .png
+    with span('ingest.png'):
+        gdal.Translate(png_path, ds, format='PNG')
+
+    # Overview pyramid: points merged over 2x2, 4x4, ... blocks of the sampling grid, and PNGs averaged
+    # by GDAL over the same factors (nodata pixels are left out of the averages)
+    levels = []
+    with span('ingest.pyramid'):
+        for factor, level_npy_path, num_points in pyramid.write_point_levels(npy_path, rows, cols, lons, lats, values):
+            level_png_path = pyramid.level_path(png_path, factor)
+            gdal.Translate(
+                level_png_path, ds, format='PNG', resampleAlg='average',
+                width=-(-ds.RasterXSize // factor), height=-(-ds.RasterYSize // factor)
+            )
+            levels.append({
+                "factor": factor,
+                "npy": f"./{pointstore.POINTS_DIR}/{os.path.basename(level_npy_path)}",
+                "image": f"./png/{os.path.basename(level_png_path)}",
+                "points": num_points
+            })
+
+    # Create a dictionary for the image and bounding box info
+    return {
+        "name": base_name,
+        "csv": f"./csv/{base_name}.csv",
+        "npy": f"./{pointstore.POINTS_DIR}/{base_name}{pointstore.POINTS_EXT}",
+        "grid": f"./{pointstore.GRID_DIR}/{base_name}{pointstore.POINTS_EXT}",
+        "image": f"./png/{base_name}.png",
+        "tif": f"./tif/{filename}",
+        "levels": levels,
+        "bounding_box": {
+            "southwest": {
+                "lat": float(miny_lat),
+                "lng": float(minx_lon)
+            },
+            "northeast": {
+                "lat": float(maxy_lat),
+                "lng": float(maxx_lon)
+            }
+        }
+    }
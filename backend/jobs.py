@@ -0,0 +1,186 @@
+import multiprocessing
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import timing
+
+# Job states, in order
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while the queue already holds its maximum number of unfinished jobs."""
+
+
+# Set in every worker process; stage updates go back to the parent through it
+_progress_queue = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def _run_job(job_id, func, args, kwargs):
+    def report(stage, fraction):
+        _progress_queue.put((job_id, stage, fraction))
+    # Spans timed in the worker are sent back with the result and recorded in the parent's metrics
+    with timing.collect() as spans:
+        result = func(*args, progress=report, **kwargs)
+    return result, spans
+
+
+class Job:
+    """One submitted call and, once it has finished, its result or error."""
+
+    def __init__(self, job_id, key, layer):
+        self.id = job_id
+        self.key = key
+        self.layer = layer
+        self.state = QUEUED
+        self.stage = None
+        self.progress = 0.0
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+
+class JobQueue:
+    """Runs calls in a pool of worker processes and keeps their results for result_ttl seconds.
+
+    Submitting the same key again while its job is unfinished (or its result is still kept) returns the
+    existing job. At most max_queued jobs may be unfinished at once, so bursts are turned away early
+    instead of piling up. The worker pool is started on the first submission.
+    """
+
+    def __init__(self, max_workers, max_queued, result_ttl):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._jobs = OrderedDict()  # Submission order
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+
+    def _start(self):
+        # Called with the lock held
+        if self._executor is None:
+            self._progress_queue = multiprocessing.Queue()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, initializer=_init_worker, initargs=(self._progress_queue,)
+            )
+            threading.Thread(target=self._watch_progress, name='job-progress', daemon=True).start()
+
+    def _watch_progress(self):
+        while True:
+            job_id, stage, fraction = self._progress_queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is not None and not job.finished:
+                    if job.state == QUEUED:
+                        job.state, job.started_at = RUNNING, time.time()
+                    job.stage, job.progress = stage, fraction
+
+    def _purge(self):
+        # Called with the lock held: forget finished jobs whose result has expired
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished and now - job.finished_at > self.result_ttl]:
+            job = self._jobs.pop(job_id)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def submit(self, key, layer, func, *args, **kwargs):
+        """Queues func(*args, progress=callback, **kwargs) in a worker process and returns its Job.
+
+        func must be picklable and accept a progress(stage, fraction) callback.
+        Raises JobQueueFull when max_queued jobs are already unfinished.
+        """
+        with self._lock:
+            self._purge()
+            job = self._by_key.get(key)
+            if job is not None and job.state != FAILED:
+                return job
+            if sum(1 for job in self._jobs.values() if not job.finished) >= self.max_queued:
+                raise JobQueueFull(f"{self.max_queued} jobs are already queued or running")
+
+            self._start()
+            job = Job(uuid.uuid4().hex, key, layer)
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+            future = self._executor.submit(_run_job, job.id, func, args, kwargs)
+        future.add_done_callback(lambda future: self._finish(job, future))
+        return job
+
+    def add_result(self, key, layer, result):
+        """Records an already available result (e.g. from a cache) as a finished job and returns it."""
+        with self._lock:
+            self._purge()
+            job = self._by_key.get(key)
+            if job is not None and job.state != FAILED:
+                return job
+            job = Job(uuid.uuid4().hex, key, layer)
+            job.state, job.stage, job.progress, job.result = DONE, None, 1.0, result
+            job.started_at = job.finished_at = job.submitted_at
+            self._jobs[job.id] = job
+            self._by_key[key] = job
+        return job
+
+    def _finish(self, job, future):
+        error = future.exception()
+        with self._lock:
+            job.finished_at = time.time()
+            if job.started_at is None:
+                job.started_at = job.finished_at
+            if error is not None:
+                job.state, job.error = FAILED, error
+            else:
+                job.result, spans = future.result()
+                job.state, job.progress = DONE, 1.0
+        timing.record('job.queued', job.started_at - job.submitted_at)
+        timing.record('job.run', job.finished_at - job.started_at)
+        if error is None:
+            timing.record_all(spans)
+
+    def get(self, job_id):
+        """Returns the job with the given id, or None if it is unknown or its result has expired."""
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def status(self, job):
+        """Returns a JSON-serializable summary of a job."""
+        with self._lock:
+            status = {
+                'id': job.id,
+                'state': job.state,
+                'stage': job.stage,
+                'progress': job.progress,
+                'submitted_at': job.submitted_at,
+                'started_at': job.started_at,
+                'finished_at': job.finished_at,
+            }
+            if job.state == QUEUED:
+                queued = [other for other in self._jobs.values() if other.state == QUEUED]
+                status['position'] = queued.index(job)
+            if job.state == FAILED:
+                status['error'] = str(job.error)
+            if job.finished:
+                status['expires_at'] = job.finished_at + self.result_ttl
+        return status
+
+    def stats(self):
+        with self._lock:
+            self._purge()
+            states = [job.state for job in self._jobs.values()]
+        stats = {state: states.count(state) for state in (QUEUED, RUNNING, DONE, FAILED)}
+        stats.update({'max_workers': self.max_workers, 'max_queued': self.max_queued, 'result_ttl': self.result_ttl})
+        return stats
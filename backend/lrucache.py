@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+
+
+def sizeof(value):
+    """Returns the size in bytes of a cached value (NumPy arrays and bytes-like objects)."""
+    return value.nbytes if hasattr(value, 'nbytes') else len(value)
+
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by the total size in bytes of its values."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def stats(self):
+        """Returns the hit/miss/eviction counters and the current size of the cache."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+            stats['max_bytes'] = self.max_bytes
+        return stats
+
+    def get(self, key):
+        """Returns the cached value for key, or None."""
+        value = self._lookup(key)
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def put(self, key, value):
+        """Adds a value to the cache (values larger than the whole budget are not kept) and returns it."""
+        self._store(key, value)
+        return value
+
+    def get_or_create(self, key, create):
+        """Returns the cached value for key, computing and caching it with create() on a miss."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, create())
+        return value
+
+    def resize(self, max_bytes):
+        """Changes the budget, evicting the least recently used values that no longer fit."""
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        """Empties the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _count(self, counter, amount=1):
+        with self._lock:
+            self._stats[counter] = self._stats.get(counter, 0) + amount
+
+    def _lookup(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def _store(self, key, value):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = value
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held: drops least recently used values until the cache fits its budget
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= sizeof(evicted)
+            self._stats['evictions'] += 1
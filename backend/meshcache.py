@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from lrucache import LRUCache
+
+# Request coordinates are snapped to this grid (in degrees, ~11 m) so that repeated clicks on the
+# same spot share a cache entry; the mesh is generated for the snapped coordinates.
+COORDINATE_QUANTUM = 1e-4
+
+CACHE_EXT = '.npy'
+
+
+def quantize(value, quantum=COORDINATE_QUANTUM):
+    """Snaps a coordinate to the cache grid."""
+    return round(round(value / quantum) * quantum, 10)
+
+
+def source_fingerprint(path):
+    """Returns (path, mtime_ns, size) for a source file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.abspath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def make_key(sources, **params):
+    """Builds a content-addressed cache key from the source files and the mesh parameters.
+
+    The key covers the mtime and size of every source file, so re-ingesting a granule
+    produces a different key and stale meshes simply age out of the cache.
+    """
+    fingerprints = [source_fingerprint(path) for path in sorted(sources)]
+    payload = json.dumps({'sources': fingerprints, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MeshCache(LRUCache):
+    """LRU cache of generated meshes bounded by a byte budget, with an optional on-disk tier.
+
+    Cached meshes are read-only NumPy arrays shared between requests.
+    """
+
+    def __init__(self, max_bytes, disk_dir=None, disk_max_bytes=0):
+        super().__init__(max_bytes)
+        self.disk_dir = disk_dir if disk_max_bytes > 0 else None
+        self.disk_max_bytes = disk_max_bytes
+        self._stats.update({'disk_hits': 0, 'disk_writes': 0, 'disk_evictions': 0})
+
+    def stats(self):
+        stats = super().stats()
+        stats['disk_enabled'] = self.disk_dir is not None
+        return stats
+
+    def get(self, key):
+        """Returns the cached mesh for key from memory or disk, or None."""
+        records = self._lookup(key)
+        if records is not None:
+            self._count('hits')
+            return records
+
+        records = self._read_disk(key)
+        if records is None:
+            self._count('misses')
+            return None
+        self._count('disk_hits')
+        self._store(key, records)
+        return records
+
+    def put(self, key, records):
+        """Adds a mesh to the cache and returns the (read-only) cached array."""
+        records.flags.writeable = False
+        self._store(key, records)
+        self._write_disk(key, records)
+        return records
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + CACHE_EXT)
+
+    def _read_disk(self, key):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            records = np.load(path)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # Mark as recently used for disk eviction
+        records.flags.writeable = False
+        return records
+
+    def _write_disk(self, key, records):
+        if self.disk_dir is None or records.nbytes > self.disk_max_bytes:
+            return
+        if not os.path.exists(self.disk_dir):
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=CACHE_EXT + '.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, records)
+            os.replace(tmp_path, self._disk_path(key))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._count('disk_writes')
+        self._trim_disk()
+
+    def _trim_disk(self):
+        # Remove the least recently used files until the disk tier fits its budget
+        files = []
+        for filename in os.listdir(self.disk_dir):
+            if filename.endswith(CACHE_EXT):
+                path = os.path.join(self.disk_dir, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self._count('disk_evictions')
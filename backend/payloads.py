@@ -0,0 +1,38 @@
+import gzip
+import hashlib
+import json
+
+# Payloads are compressed once, so the slowest (smallest) setting is worth it
+GZIP_LEVEL = 9
+
+
+def strong_etag(body):
+    """Returns a strong ETag (without quotes) for a response body."""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+class Payload:
+    """A response body serialized once, together with its gzip-compressed form and a strong ETag for each.
+
+    The two encodings are different representations, so they get different ETags.
+    """
+
+    def __init__(self, body, mimetype):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = strong_etag(body)
+        # mtime=0 keeps the compressed bytes (and their ETag) the same across restarts
+        self.gzipped = gzip.compress(body, GZIP_LEVEL, mtime=0)
+        self.gzip_etag = strong_etag(self.gzipped)
+
+    @classmethod
+    def from_json(cls, data):
+        """Serializes data as compact JSON with sorted keys (the same document jsonify returns)."""
+        body = json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8') + b'\n'
+        return cls(body, 'application/json')
+
+    def encoded(self, accept_gzip):
+        """Returns (body, etag) of the gzip-compressed form if the client accepts it, else of the plain one."""
+        if accept_gzip:
+            return self.gzipped, self.gzip_etag
+        return self.body, self.etag
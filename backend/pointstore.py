@@ -0,0 +1,136 @@
+import argparse
+import csv
+import os
+import tempfile
+import numpy as np
+
+# Binary point files live in a sibling 'npy' directory next to the 'csv' directory of each dataset,
+# e.g. data/swot/csv/NAME.csv -> data/swot/npy/NAME.npy
+POINTS_DIR = 'npy'
+POINTS_EXT = '.npy'
+
+# Gridded datasets also keep the ingest grid itself in a sibling 'grid' directory, for meshing straight
+# from the raster: a (3, rows, cols) float64 array of lon/lat/value with NaN values for nodata cells
+GRID_DIR = 'grid'
+
+# Points are stored as a single (3, N) float64 array: row 0 is longitude, row 1 latitude, row 2 the value.
+# Each row is contiguous, so every column can be read straight out of the memory map.
+# Pyramid levels (see pyramid.py) add two rows with the minimum and maximum of the merged values.
+POINTS_DTYPE = np.float64
+LON, LAT, VALUE = 0, 1, 2
+VALUE_MIN, VALUE_MAX = 3, 4
+
+
+def points_path_for(csv_path):
+    """Returns the path of the binary point file that corresponds to a CSV file."""
+    csv_dir, filename = os.path.split(os.path.abspath(csv_path))
+    name = os.path.splitext(filename)[0]
+    return os.path.join(os.path.dirname(csv_dir), POINTS_DIR, name + POINTS_EXT)
+
+
+def grid_path_for(csv_path):
+    """Returns the path of the grid file that corresponds to a CSV file."""
+    csv_dir, filename = os.path.split(os.path.abspath(csv_path))
+    name = os.path.splitext(filename)[0]
+    return os.path.join(os.path.dirname(csv_dir), GRID_DIR, name + POINTS_EXT)
+
+
+def save_array(path, array):
+    """Saves an array under a temporary name and renames it into place, so readers that have
+    the file memory-mapped keep seeing the old contents until they reopen it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=POINTS_EXT + '.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def write_points(path, lons, lats, values, *extra_columns):
+    """Writes lon/lat/value columns (and any extra columns, e.g. value min/max) to a binary point file."""
+    save_array(path, np.vstack([
+        np.asarray(column, dtype=POINTS_DTYPE) for column in (lons, lats, values) + extra_columns
+    ]))
+
+
+def write_grid(path, lons, lats, values):
+    """Writes 2D lon/lat/value arrays (NaN or masked values for nodata cells) to a grid file."""
+    grid = np.stack([np.ma.filled(np.ma.asarray(column, dtype=POINTS_DTYPE), np.nan) for column in (lons, lats, values)])
+    grid[:, np.isnan(grid).any(axis=0)] = np.nan
+    save_array(path, grid)
+
+
+def points_to_grid(shape, rows, cols, lons, lats, values):
+    """Scatters points with known grid rows/cols back into 2D lon/lat/value arrays (NaN where there is no point)."""
+    grid = np.full((3,) + tuple(shape), np.nan, dtype=POINTS_DTYPE)
+    grid[LON, rows, cols] = lons
+    grid[LAT, rows, cols] = lats
+    grid[VALUE, rows, cols] = values
+    return grid[LON], grid[LAT], grid[VALUE]
+
+
+def load_points(path):
+    """Memory-maps a binary point file and returns its (rows, N) read-only array without copying it."""
+    return np.load(path, mmap_mode='r')
+
+
+def load_grid(path):
+    """Memory-maps a grid file and returns its (3, rows, cols) read-only array."""
+    return np.load(path, mmap_mode='r')
+
+
+def is_current(points_path, csv_path):
+    """Returns True if the binary point file exists and is at least as new as its CSV."""
+    if not os.path.exists(points_path):
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    return os.path.getmtime(points_path) >= os.path.getmtime(csv_path)
+
+
+def read_csv_columns(csv_path, columns):
+    """Reads the (longitude, latitude, value) columns of a CSV file into float arrays."""
+    lon_key, lat_key, value_key = columns
+    with open(csv_path, 'r') as f:
+        header = next(csv.reader(f))
+    missing = [key for key in columns if key not in header]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in {csv_path}. Available keys are: {header}")
+
+    usecols = [header.index(lon_key), header.index(lat_key), header.index(value_key)]
+    data = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=usecols, dtype=POINTS_DTYPE, ndmin=2)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+def convert_csv(csv_path, columns, points_path=None):
+    """Converts an existing CSV point cloud into a binary point file and returns the new file's path."""
+    if points_path is None:
+        points_path = points_path_for(csv_path)
+    lons, lats, values = read_csv_columns(csv_path, columns)
+    write_points(points_path, lons, lats, values)
+    return points_path
+
+
+if __name__ == "__main__":
+    from datasets import DATASETS, get_dataset
+
+    parser = argparse.ArgumentParser(description='Convert CSV point clouds into binary point files')
+    parser.add_argument('csv_files', type=str, nargs='+', help='CSV files to convert')
+    parser.add_argument('--dataset', choices=list(DATASETS), required=True, help='Dataset the CSV files belong to')
+    parser.add_argument('--force', action='store_true', help='Rewrite binary files that are already up to date')
+
+    args = parser.parse_args()
+    columns = get_dataset(args.dataset).columns
+    for csv_file in args.csv_files:
+        points_path = points_path_for(csv_file)
+        if not args.force and is_current(points_path, csv_file):
+            print(f"Up to date: {points_path}")
+            continue
+        convert_csv(csv_file, columns, points_path)
+        print(f"Wrote {points_path}")
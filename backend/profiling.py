@@ -0,0 +1,70 @@
+import cProfile
+import os
+import threading
+import time
+import uuid
+
+# Profilers a request can ask for, and the extension of the dump each one writes
+PROFILERS = {
+    'cprofile': '.prof',  # pstats file (python -m pstats, snakeviz)
+    'pyinstrument': '.html',  # pyinstrument's HTML report (needs the optional pyinstrument package)
+}
+
+
+class ProfilerUnavailable(Exception):
+    """Raised when the requested profiler is unknown or not installed, or another profile is running."""
+
+
+# Only one request is profiled at a time (a cProfile profiler cannot run alongside another in the same process)
+_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """Profiles the work done between start() and stop() on the current thread with cProfile or pyinstrument."""
+
+    def __init__(self, kind):
+        if kind not in PROFILERS:
+            raise ProfilerUnavailable(f"Unknown profiler '{kind}'. Expected one of: {', '.join(PROFILERS)}")
+        if kind == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ProfilerUnavailable("pyinstrument is not installed")
+            self._profiler = Profiler()
+        else:
+            self._profiler = cProfile.Profile()
+        self.kind = kind
+        self._running = False
+
+    def start(self):
+        if not _lock.acquire(blocking=False):
+            raise ProfilerUnavailable("Another request is being profiled")
+        self._running = True
+        if self.kind == 'pyinstrument':
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self):
+        if not self._running:
+            return
+        try:
+            if self.kind == 'pyinstrument':
+                self._profiler.stop()
+            else:
+                self._profiler.disable()
+        finally:
+            self._running = False
+            _lock.release()
+
+    def dump(self, directory, label):
+        """Writes the profile to a new file in directory and returns the file name."""
+        os.makedirs(directory, exist_ok=True)
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}{PROFILERS[self.kind]}"
+        path = os.path.join(directory, filename)
+        if self.kind == 'pyinstrument':
+            with open(path, 'w') as f:
+                f.write(self._profiler.output_html())
+        else:
+            self._profiler.dump_stats(path)
+        return filename
@@ -0,0 +1,125 @@
+import os
+import numpy as np
+import pointstore
+
+# Every level halves the resolution of the previous one: factors 2, 4, 8, ... of the ingest grid.
+# Levels stop once they would hold fewer than MIN_LEVEL_POINTS points.
+MAX_LEVELS = 8
+MIN_LEVEL_POINTS = 256
+
+# How the values of the grid cells merged into one pyramid cell are combined
+AGGREGATES = ('mean', 'min', 'max')
+DEFAULT_AGGREGATE = 'mean'
+
+
+def level_path(path, factor):
+    """Returns the path of a pyramid level next to its full-resolution file, e.g. NAME.npy -> NAME.4x.npy."""
+    if factor == 1:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.{factor}x{ext}"
+
+
+def level_factors(num_levels):
+    return [2 ** level for level in range(1, num_levels + 1)]
+
+
+def find_levels(path):
+    """Returns the factors of the pyramid levels on disk for a full-resolution file (always including 1).
+
+    Levels are written after their full-resolution file, so older ones are left over from a previous ingest.
+    """
+    factors = [1]
+    mtime = os.path.getmtime(path)
+    for factor in level_factors(MAX_LEVELS):
+        try:
+            if os.path.getmtime(level_path(path, factor)) < mtime:
+                break
+        except OSError:
+            break
+        factors.append(factor)
+    return factors
+
+
+def aggregate_points(rows, cols, lons, lats, values, factor):
+    """Merges the valid points of every factor x factor block of grid cells into one point.
+
+    rows/cols are the grid indices of each point; masked (missing) cells simply have no point, so
+    the averages only cover valid data. Returns lon/lat/mean/min/max arrays ordered by block.
+    """
+    block_rows, block_cols = rows // factor, cols // factor
+    keys = block_rows * (int(block_cols.max()) + 1) + block_cols
+    unique_keys, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+    def mean(column):
+        return np.bincount(inverse, weights=column, minlength=len(unique_keys)) / counts
+
+    mins = np.full(len(unique_keys), np.inf)
+    maxs = np.full(len(unique_keys), -np.inf)
+    np.minimum.at(mins, inverse, values)
+    np.maximum.at(maxs, inverse, values)
+    return mean(lons), mean(lats), mean(values), mins, maxs
+
+
+def build_levels(rows, cols, lons, lats, values):
+    """Returns [(factor, (lons, lats, means, mins, maxs)), ...] for every pyramid level worth keeping."""
+    levels = []
+    if len(values) == 0:
+        return levels
+    for factor in level_factors(MAX_LEVELS):
+        columns = aggregate_points(rows, cols, lons, lats, values, factor)
+        if len(columns[0]) < MIN_LEVEL_POINTS:
+            break
+        levels.append((factor, columns))
+    return levels
+
+
+def write_point_levels(points_path, rows, cols, lons, lats, values):
+    """Builds the pyramid of a binary point file and writes each level next to it.
+
+    Returns [(factor, level path, number of points), ...].
+    """
+    written = []
+    for factor, (level_lons, level_lats, means, mins, maxs) in build_levels(rows, cols, lons, lats, values):
+        path = level_path(points_path, factor)
+        pointstore.write_points(path, level_lons, level_lats, means, mins, maxs)
+        written.append((factor, path, len(means)))
+    return written
+
+
+def downsample_grid(grid, factor):
+    """Averages factor x factor blocks of a 2D masked array, ignoring masked cells.
+
+    Blocks without any valid cell are masked in the result; edge blocks may be partial.
+    """
+    grid = np.ma.asarray(grid)
+    num_rows, num_cols = grid.shape
+    padded_rows, padded_cols = -(-num_rows // factor) * factor, -(-num_cols // factor) * factor
+
+    values = np.zeros((padded_rows, padded_cols))
+    valid = np.zeros((padded_rows, padded_cols), dtype=bool)
+    values[:num_rows, :num_cols] = np.ma.getdata(grid)
+    valid[:num_rows, :num_cols] = ~np.ma.getmaskarray(grid)
+    values[~valid] = 0
+
+    shape = (padded_rows // factor, factor, padded_cols // factor, factor)
+    sums = values.reshape(shape).sum(axis=(1, 3))
+    counts = valid.reshape(shape).sum(axis=(1, 3))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+    return np.ma.masked_array(means, mask=counts == 0)
+
+
+def choose_level(factors, coarse_count, max_points):
+    """Returns the finest level factor whose expected point count stays within max_points.
+
+    coarse_count is the number of points the coarsest level (factors[-1]) has in the requested region;
+    each level holds about a quarter of the points of the level below it.
+    """
+    if max_points is None:
+        return factors[0]
+    coarsest = factors[-1]
+    for factor in factors:
+        if coarse_count * (coarsest / factor) ** 2 <= max_points:
+            return factor
+    return coarsest
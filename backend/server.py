@@ -1,18 +1,32 @@
-from flask import Flask, jsonify, request, send_file, abort
+from flask import Flask, Response, g, jsonify, request, send_file, abort
 import os
 import json
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from urllib.parse import urlencode
 from flask_cors import CORS
-import subprocess
+import timing
+from datasets import DATASETS
+from pointstore import points_path_for, grid_path_for
+from spatial import FootprintIndex, index_cache
+from meshcache import MeshCache, make_key, quantize
+from payloads import Payload, strong_etag
+from catalog import Catalog, QueryError, granule_name, parse_bbox, parse_time, iter_geojson, DEFAULT_LIMIT, MAX_LIMIT
+from tiles import TileRenderer, is_valid_tile, MAX_ZOOM
+from jobs import JobQueue, JobQueueFull, QUEUED, RUNNING, DONE, FAILED
+from terrain import generate_mesh, validate_mesh_options, iter_stl, binary_stl_size, TerrainError, InvalidRegionError
+from terrain import DEFAULT_RADIUS, DEFAULT_SHAPE, DEFAULT_UNITS, DEFAULT_MAX_POINTS, DEFAULT_MESH_MODE, MESH_MODES, XY_SIZE, Z_SIZE
+from terrain import MERGE_POLICIES, DEFAULT_MERGE
+from pyramid import AGGREGATES, DEFAULT_AGGREGATE
+from profiling import RequestProfiler, ProfilerUnavailable
+from timeseries import TimeSeriesIndex, TimeSeriesExtractor, SERIES_COLUMNS
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "Link"])  # Let the map read the get_json paging headers
 
 # Base directory setup
 base_dir = os.path.dirname(os.path.abspath(__file__))  # The directory where server.py is located
-elevation_dir = os.path.join(base_dir, 'data', 'elevation')
-water_level_dir = os.path.join(base_dir, 'data', 'water-level')
-swot_dir = os.path.join(base_dir, 'data', 'swot')  # Added SWOT directory
-csv_dir = os.path.join(swot_dir, 'csv')
 
 # Load JSON locations
 def load_locations(directory):
@@ -24,112 +38,396 @@ def load_locations(directory):
         print(f"Warning: {location_file} not found.")
     return []
 
-# Load elevation, water-level, and SWOT locations
-elevation_locations = load_locations(elevation_dir)
-water_level_locations = load_locations(water_level_dir)
-swot_locations = load_locations(swot_dir)
-
-# Helper function to get image path
-def get_image_path(directory, name):
-    if not name.endswith('.png'):
-        name = f"{name}.png"
-
-    png_path = os.path.join(directory, 'png', name)
-    print(f"Looking for image at: {png_path}")  # Debug print
-    if os.path.exists(png_path):
-        return png_path
-    return None
-
-# Common function to serve images based on directory and name
-def serve_image(directory, name):
+# Generated meshes are cached per layer in memory, and optionally on disk under data/<dataset>/cache
+STL_CACHE_MAX_BYTES = int(os.environ.get('STL_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+STL_CACHE_DISK_MAX_BYTES = int(os.environ.get('STL_CACHE_DISK_MAX_BYTES', 0))  # 0 disables the disk tier
+
+# KD-trees over granule points are kept in memory within this budget, shared by every layer
+INDEX_CACHE_MAX_BYTES = int(os.environ.get('INDEX_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+index_cache.resize(INDEX_CACHE_MAX_BYTES)
+
+# Asynchronous STL jobs run in a pool of worker processes; finished meshes are kept for STL_JOB_RESULT_TTL seconds
+STL_JOB_WORKERS = int(os.environ.get('STL_JOB_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+STL_JOB_MAX_QUEUED = int(os.environ.get('STL_JOB_MAX_QUEUED', 32))  # Unfinished jobs beyond this are turned away with a 503
+STL_JOB_RESULT_TTL = int(os.environ.get('STL_JOB_RESULT_TTL', 600))
+STL_JOB_RETRY_AFTER = 5  # Seconds a client turned away should wait before retrying
+stl_jobs = JobQueue(STL_JOB_WORKERS, STL_JOB_MAX_QUEUED, STL_JOB_RESULT_TTL)
+# Jobs are kept by the process that queued them; wsgi.create_app turns the job routes off when several
+# worker processes share the port and clients are not routed back to the same one
+stl_jobs_enabled = True
+
+# Water-surface time series read uncached granules in a pool of TIMESERIES_WORKERS processes; the values each
+# granule has in a queried region are cached, so repeat queries only aggregate
+TIMESERIES_WORKERS = int(os.environ.get('TIMESERIES_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+TIMESERIES_CACHE_MAX_BYTES = int(os.environ.get('TIMESERIES_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+timeseries = TimeSeriesExtractor(TIMESERIES_WORKERS, TIMESERIES_CACHE_MAX_BYTES)
+
+# Map tiles are cut from the granule PNGs; decoded images and encoded tiles are cached per layer
+TILE_IMAGE_CACHE_MAX_BYTES = int(os.environ.get('TILE_IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+TILE_CACHE_MAX_BYTES = int(os.environ.get('TILE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+TILE_MAX_AGE = 3600  # Seconds browsers may reuse a tile
+
+# Granule PNGs may be reused for this many seconds and are revalidated with their ETag/Last-Modified after that;
+# location lists are always revalidated, which costs a 304 while they are unchanged
+IMAGE_MAX_AGE = 3600
+
+
+# Seconds between checks of a layer's locations.json for changes (it is reloaded when its mtime changes)
+LOCATIONS_RELOAD_INTERVAL = float(os.environ.get('LOCATIONS_RELOAD_INTERVAL', 2))
+
+# With PROFILE_REQUESTS set, a request with an 'X-Profile: cprofile' (or 'pyinstrument') header is profiled;
+# the dump is written to PROFILE_DIR and named in the X-Profile-File response header
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(base_dir, 'data', 'profiles'))
+
+
+# Returns the absolute path of a file referenced by locations.json, or None if it resolves outside the dataset directory
+def resolve_data_path(directory, relative_path):
+    path = os.path.realpath(os.path.join(directory, relative_path))
+    if os.path.commonpath([path, os.path.realpath(directory)]) != os.path.realpath(directory):
+        return None
+    return path
+
+
+# Everything a layer derives from its locations.json: the locations, the get_json body (serialized and
+# compressed once), point and bounding-box lookups of granule footprints, the catalog of viewport, date and
+# paged get_json queries, the time-series index (only for layers that serve time series), granule name ->
+# locations.json entry, granule name -> absolute path of its PNG and normalized 'csv' entry -> absolute path
+LayerState = namedtuple('LayerState', [
+    'locations', 'locations_payload', 'index', 'catalog', 'timeseries_index', 'by_name', 'image_paths', 'csv_paths',
+])
+
+
+class Layer:
+    """A registered dataset and everything the server keeps for it: its LayerState, the mesh cache and the
+    tile renderer.
+
+    The state is rebuilt when locations.json changes (checked at most every LOCATIONS_RELOAD_INTERVAL
+    seconds), so re-running ingest needs no restart. It is replaced as a whole, so a request that reads
+    layer.state once sees either the old or the new locations, never a mix.
+    """
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.name = dataset.name
+        self.directory = dataset.directory
+        self.mesh_cache = MeshCache(STL_CACHE_MAX_BYTES, dataset.path('cache'), STL_CACHE_DISK_MAX_BYTES)
+        self.tiles = TileRenderer(dataset.directory, [], TILE_IMAGE_CACHE_MAX_BYTES, TILE_CACHE_MAX_BYTES)
+        self._lock = threading.Lock()
+        self._locations_mtime = None
+        self._checked_at = time.monotonic()
+        self.load()
+
+    def _mtime(self):
+        try:
+            return os.stat(self.dataset.location_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def load(self):
+        """(Re)builds everything derived from locations.json."""
+        mtime = self._mtime()
+        locations = load_locations(self.directory)
+        by_name, image_paths, csv_paths = {}, {}, {}
+        for location in locations:
+            if location.get('image'):
+                name = granule_name(location)
+                by_name[name] = location
+                # Images are served from png/ (as before); only ones that exist are kept, so unknown or
+                # missing names cost no disk access per request
+                image_path = resolve_data_path(self.directory, os.path.join('png', f"{name}.png"))
+                if image_path is not None and os.path.isfile(image_path):
+                    image_paths[name] = image_path
+            if location.get('csv'):
+                csv_path = resolve_data_path(self.directory, location['csv'])
+                if csv_path is not None:
+                    csv_paths[os.path.normpath(location['csv'])] = csv_path
+
+        state = LayerState(
+            locations=locations,
+            locations_payload=Payload.from_json(locations),
+            index=FootprintIndex(locations),
+            catalog=Catalog(locations),
+            timeseries_index=TimeSeriesIndex(locations, csv_paths) if self.dataset.time_series else None,
+            by_name=by_name,
+            image_paths=image_paths,
+            csv_paths=csv_paths,
+        )
+        # Swap the finished state in at once; loads never overlap, as refresh holds the lock around them
+        self.state = state
+        self.tiles.set_locations(locations)
+        self._locations_mtime = mtime
+
+    def refresh(self):
+        """Reloads locations.json if it has changed since it was loaded (checked at most every LOCATIONS_RELOAD_INTERVAL seconds)."""
+        now = time.monotonic()
+        if now - self._checked_at < LOCATIONS_RELOAD_INTERVAL:
+            return
+        with self._lock:
+            if now - self._checked_at < LOCATIONS_RELOAD_INTERVAL:
+                return
+            self._checked_at = now
+            if self._mtime() != self._locations_mtime:
+                logger.info(f"Reloading {self.dataset.location_file}")
+                self.load()
+
+
+# One layer per registered dataset; every route below is served for each of them
+layers = OrderedDict((name, Layer(dataset)) for name, dataset in DATASETS.items())
+
+# URL rule part that matches the name of any layer, e.g. '/<layer>/get_json'
+LAYER = '<any({}):layer_name>'.format(', '.join(f'"{name}"' for name in layers))
+
+# URL rule part that matches the layers whose granules are time-stamped passes, e.g. '/swot/timeseries'
+TIME_SERIES_LAYER = '<any({}):layer_name>'.format(', '.join(f'"{name}"' for name, layer in layers.items() if layer.dataset.time_series))
+
+# Returns the layer a request is for, with its locations up to date
+def get_layer(layer_name):
+    layer = layers[layer_name]
+    layer.refresh()
+    return layer
+
+# Returns the granule name a request refers to, accepting it with or without the '.png' extension
+def requested_granule_name(name):
+    return name[:-len('.png')] if name.endswith('.png') else name
+
+# Common function to serve a layer's granule images by name. Names are only looked up in the layer's
+# name -> path map, so unknown names (including ones like '../x') never reach the filesystem.
+def serve_image(layer, name):
     if not name:
         return abort(400, description="Image name is required")
 
-    image_path = get_image_path(directory, name)
+    image_path = layer.state.image_paths.get(requested_granule_name(name))
     if image_path:
-        print(f"Serving image: {image_path}")
-        return send_file(image_path, mimetype='image/png')
-
-    print(f"Error: Image {name} not found in {directory}")
+        try:
+            # send_file answers If-None-Match/If-Modified-Since with a 304 and Range requests with a 206
+            with timing.span('image.send'):
+                return send_file(image_path, mimetype='image/png', conditional=True, etag=True, max_age=IMAGE_MAX_AGE)
+        except FileNotFoundError:
+            pass  # Removed since locations.json was loaded
+
+    logger.warning(f"Image {name} not found in {layer.directory}")
     return abort(404, description="Image not found")
 
+# Common function to serve a map tile, leaving out the granules listed in the optional 'hide' parameter or,
+# with 'show', every granule not listed in it (clients send whichever list is shorter)
+def serve_tile(tile_renderer, z, x, y):
+    if not is_valid_tile(z, x, y):
+        return abort(404, description="Tile not found")
+
+    hidden = [name for name in request.args.get('hide', '').split(',') if name]
+    shown = [name for name in request.args['show'].split(',') if name] if 'show' in request.args else None
+    with timing.span('tile.render'):
+        tile = tile_renderer.render(z, x, y, hidden, shown)
+    response = Response(tile, mimetype='image/png')
+    response.headers['Cache-Control'] = f'public, max-age={TILE_MAX_AGE}'
+    return response
+
+# Common function to serve a pre-serialized payload, gzipped for clients that accept it and
+# answered with a 304 when the client already has the same representation
+def send_payload(payload):
+    body, etag = payload.encoded('gzip' in request.accept_encodings)
+    response = Response(body, mimetype=payload.mimetype)
+    if body is payload.gzipped:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
 # Common function to serve JSON data (bounding boxes)
-def serve_json(locations):
-    if not locations:
+def serve_json(layer):
+    state = layer.state
+    if not state.locations:
         return abort(404, description="No data available")
-    return jsonify(locations)
+    return send_payload(state.locations_payload)
 
 # Common function to get longitude and latitude from image name
-def get_coordinates(locations, name):
+def get_coordinates(layer, name):
     if not name:
         return abort(400, description="Image name is required")
 
-    for loc in locations:
-        if loc['image'].endswith(f"{name}.png"):
-            return jsonify(loc['bounding_box'])
+    location = layer.state.by_name.get(requested_granule_name(name))
+    if location is not None:
+        return jsonify(location['bounding_box'])
 
     return abort(404, description="Coordinates not found for the specified image")
 
-# Elevation endpoints
-@app.route('/elevation/get_image', methods=['GET'])
-def get_elevation_image():
-    name = request.args.get('name')
-    return serve_image(elevation_dir, name)
-
-@app.route('/elevation/get_json', methods=['GET'])
-def get_elevation_json():
-    return serve_json(elevation_locations)
-
-@app.route('/elevation/get_longitude_latitude', methods=['GET'])
-def get_elevation_coordinates():
-    name = request.args.get('name')
-    return get_coordinates(elevation_locations, name)
-
-# Water-level endpoints
-@app.route('/water-level/get_image', methods=['GET'])
-def get_water_level_image():
+# Layer endpoints, served for every registered dataset
+@app.route(f'/{LAYER}/get_image', methods=['GET'])
+def get_image(layer_name):
     name = request.args.get('name')
-    return serve_image(water_level_dir, name)
+    return serve_image(get_layer(layer_name), name)
 
-@app.route('/water-level/get_json', methods=['GET'])
-def get_water_level_json():
-    return serve_json(water_level_locations)
+@app.route(f'/{LAYER}/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_tile(layer_name, z, x, y):
+    return serve_tile(get_layer(layer_name).tiles, z, x, y)
 
-@app.route('/water-level/get_longitude_latitude', methods=['GET'])
-def get_water_level_coordinates():
-    name = request.args.get('name')
-    return get_coordinates(water_level_locations, name)
+# get_json returns every granule unless one of these query parameters is given
+LOCATION_QUERY_PARAMETERS = ('bbox', 'zoom', 'start', 'end', 'limit', 'cursor', 'format')
+LOCATION_FORMATS = ('json', 'geojson')
 
-# SWOT endpoints
-@app.route('/swot/get_image', methods=['GET'])
-def get_swot_image():
-    name = request.args.get('name')
-    return serve_image(swot_dir, name)
-
-@app.route('/swot/get_json', methods=['GET'])
-def get_swot_json():
-    return serve_json(swot_locations)
-
-@app.route('/swot/get_longitude_latitude', methods=['GET'])
-def get_swot_coordinates():
+# Common function to read the filters of a location query
+def get_location_query(args):
+    try:
+        query = {
+            'bbox': parse_bbox(args['bbox']) if args.get('bbox') else None,
+            'zoom': int(args['zoom']) if args.get('zoom') else None,
+            'start': parse_time(args['start']) if args.get('start') else None,
+            'end': parse_time(args['end'], end_of_day=True) if args.get('end') else None,
+            'cursor': args.get('cursor') or None,
+            'limit': int(args.get('limit', DEFAULT_LIMIT)),
+        }
+    except ValueError as e:
+        message = str(e) if isinstance(e, QueryError) else "zoom and limit must be valid integers"
+        abort(400, description=message)
+    if not 1 <= query['limit'] <= MAX_LIMIT:
+        abort(400, description=f"limit must be between 1 and {MAX_LIMIT}")
+    if query['zoom'] is not None and not 0 <= query['zoom'] <= MAX_ZOOM:
+        abort(400, description=f"zoom must be between 0 and {MAX_ZOOM}")
+    return query
+
+# Common function to answer a filtered, paged location query as a JSON list or a streamed GeoJSON FeatureCollection.
+# The ETag covers the locations and the query, so revalidating an unchanged page costs no query at all.
+def serve_location_query(layer):
+    output_format = request.args.get('format', 'json')
+    if output_format not in LOCATION_FORMATS:
+        abort(400, description=f"Unknown format '{output_format}'. Expected one of: {', '.join(LOCATION_FORMATS)}")
+    state = layer.state
+    etag = strong_etag(state.locations_payload.etag.encode('ascii') + b'?' + request.query_string)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        query = get_location_query(request.args)
+        try:
+            with timing.span('locations.query'):
+                page, next_cursor = state.catalog.query(**query)
+        except QueryError as e:
+            abort(400, description=str(e))
+
+        if output_format == 'geojson':
+            response = Response(iter_geojson(page, next_cursor), mimetype='application/geo+json')
+        else:
+            response = jsonify(page)
+        if next_cursor is not None:
+            response.headers['X-Next-Cursor'] = next_cursor
+            next_args = request.args.to_dict()
+            next_args['cursor'] = next_cursor
+            response.headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(etag)
+    return response
+
+# Filter with bbox (west,south,east,north), zoom, start/end (ISO dates of acquisition) and page with
+# limit/cursor; format=geojson streams a FeatureCollection. Without any of these every granule is returned.
+@app.route(f'/{LAYER}/get_json', methods=['GET'])
+def get_json(layer_name):
+    layer = get_layer(layer_name)
+    if any(parameter in request.args for parameter in LOCATION_QUERY_PARAMETERS):
+        return serve_location_query(layer)
+    return serve_json(layer)
+
+@app.route(f'/{LAYER}/get_longitude_latitude', methods=['GET'])
+def get_image_coordinates(layer_name):
     name = request.args.get('name')
-    return get_coordinates(swot_locations, name)
-
-# Function to check if two bounding boxes intersect
-def bounding_boxes_intersect(bbox1, bbox2):
-    return not (
-        bbox1['north'] < bbox2['southwest']['lat'] or
-        bbox1['south'] > bbox2['northeast']['lat'] or
-        bbox1['east'] < bbox2['southwest']['lng'] or
-        bbox1['west'] > bbox2['northeast']['lng']
-    )
-
-# Function to check if a point is inside a bounding box
-def is_point_in_bbox(lng, lat, bbox):
-    return (
-        bbox['southwest']['lng'] <= lng <= bbox['northeast']['lng'] and
-        bbox['southwest']['lat'] <= lat <= bbox['northeast']['lat']
-    )
+    return get_coordinates(get_layer(layer_name), name)
+
+# STL output formats that can be requested with the 'format' parameter
+STL_FORMATS = ('binary', 'ascii')
+
+# Common function to stream a mesh to the client while it is being encoded
+def send_stl(terrain_mesh, download_name, stl_format='binary', compress=False):
+    # The mesh belongs to this request only, so concurrent requests never share any output buffer
+    ascii = stl_format == 'ascii'
+    chunks = iter_stl(terrain_mesh, name=download_name, ascii=ascii, compress=compress)
+    response = Response(chunks, mimetype='application/sla')
+    response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+    elif not ascii:
+        response.content_length = binary_stl_size(len(terrain_mesh))
+    return response
+
+# Common function to read the optional output options (format, gzip) of an STL request
+def get_stl_options(data):
+    stl_format = data.get('format', 'binary')
+    if stl_format not in STL_FORMATS:
+        abort(400, description=f"Unknown format '{stl_format}'. Expected one of: {', '.join(STL_FORMATS)}")
+    # Only compress for clients that can decode it
+    compress = data.get('gzip') in (True, 1, '1', 'true') and 'gzip' in request.accept_encodings
+    return {'stl_format': stl_format, 'compress': compress}
+
+# A mesh request: its cache key and the generate_mesh arguments that build it
+MeshRequest = namedtuple('MeshRequest', ['key', 'csv_file_paths', 'longitude', 'latitude', 'options'])
+
+# Common function to describe a mesh request
+def get_mesh_request(csv_file_paths, longitude, latitude, columns, region, detail):
+    # Snap the point (or box) to the cache grid so repeated clicks on the same spot share an entry
+    longitude, latitude = quantize(longitude), quantize(latitude)
+    if region.get('bbox') is not None:
+        region = dict(region, bbox={edge: quantize(value) for edge, value in region['bbox'].items()})
+    sources = csv_file_paths + [points_path_for(path) for path in csv_file_paths]
+    if detail['mode'] == 'grid':
+        sources += [grid_path_for(path) for path in csv_file_paths]
+    key = make_key(sources, lng=longitude, lat=latitude, columns=columns, xy_size=XY_SIZE, z_size=Z_SIZE, **region, **detail)
+    return MeshRequest(key, csv_file_paths, longitude, latitude, dict(columns=columns, **region, **detail))
+
+# Common function to get a mesh from the cache, generating it on a miss
+def get_mesh(mesh_cache, mesh_request):
+    return mesh_cache.get_or_create(mesh_request.key, lambda: generate_mesh(
+        mesh_request.csv_file_paths, mesh_request.longitude, mesh_request.latitude, **mesh_request.options
+    ))
+
+# Common function to read the optional region (radius, shape, units) of an STL request
+def get_region(data):
+    try:
+        radius = float(data.get('radius', DEFAULT_RADIUS))
+    except (TypeError, ValueError):
+        abort(400, description="Radius must be a valid number")
+    return {
+        'radius': radius,
+        'shape': data.get('shape', DEFAULT_SHAPE),
+        'units': data.get('units', DEFAULT_UNITS),
+    }
+
+# Bounding-box edges of an STL request for a whole box instead of the region around a point
+BBOX_EDGES = ('west', 'east', 'south', 'north')
+
+# Common function to read the optional merge policy of an STL request (how overlapping granules are combined)
+def get_merge(data):
+    merge = data.get('merge', DEFAULT_MERGE)
+    if merge not in MERGE_POLICIES:
+        abort(400, description=f"Unknown merge policy '{merge}'. Expected one of: {', '.join(MERGE_POLICIES)}")
+    return merge
+
+# Common function to read the optional bounding box (west, east, south, north) and merge policy of an STL request
+def get_bbox_region(data):
+    if all(data.get(edge) is None for edge in BBOX_EDGES):
+        return None
+    try:
+        bbox = {edge: float(data.get(edge)) for edge in BBOX_EDGES}
+    except (TypeError, ValueError):
+        abort(400, description="west, east, south and north are all required and must be valid numbers")
+    if not (bbox['west'] < bbox['east'] and bbox['south'] < bbox['north']):
+        abort(400, description="The bounding box must have west < east and south < north")
+    return {'bbox': bbox, 'merge': get_merge(data)}
+
+# Common function to read the optional level of detail (max_points, aggregate, max_triangles, tolerance) and meshing mode of an STL request
+def get_detail(data):
+    try:
+        max_points = int(data.get('max_points', DEFAULT_MAX_POINTS))
+        max_triangles = int(data['max_triangles']) if data.get('max_triangles') is not None else None
+        tolerance = float(data['tolerance']) if data.get('tolerance') is not None else None
+    except (TypeError, ValueError):
+        abort(400, description="max_points and max_triangles must be valid integers and tolerance a valid number")
+    aggregate = data.get('aggregate', DEFAULT_AGGREGATE)
+    if aggregate not in AGGREGATES:
+        abort(400, description=f"Unknown aggregate '{aggregate}'. Expected one of: {', '.join(AGGREGATES)}")
+    mode = data.get('mode', DEFAULT_MESH_MODE)
+    if mode not in MESH_MODES:
+        abort(400, description=f"Unknown mode '{mode}'. Expected one of: {', '.join(MESH_MODES)}")
+    return {'max_points': max_points, 'aggregate': aggregate, 'max_triangles': max_triangles, 'tolerance': tolerance, 'mode': mode}
 
 import logging
 
@@ -137,127 +435,330 @@ import logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-@app.route('/elevation/generate_stl', methods=['POST'])
-def generate_elevation_stl():
-    data = request.json
-
-    # Log the incoming request data
-    logger.info(f"Received POST request for Elevation STL generation with data: {data}")
-
+# Common function to read the point (lng, lat) of an STL request
+def get_longitude_latitude(data):
     try:
         longitude = float(data.get('lng'))
         latitude = float(data.get('lat'))
         logger.info(f"Longitude: {longitude}, Latitude: {latitude}")
     except (TypeError, ValueError) as e:
         logger.error(f"Invalid longitude/latitude provided: {e}")
-        return abort(400, description="Longitude and latitude are required and must be valid numbers (lng, lat)")
+        abort(400, description="Longitude and latitude are required and must be valid numbers (lng, lat)")
 
     if not (longitude and latitude):
         logger.warning("Longitude and latitude are missing from the request")
-        return abort(400, description="Longitude and latitude are required (lng, lat)")
+        abort(400, description="Longitude and latitude are required (lng, lat)")
+    return longitude, latitude
+
+# Common function to turn a failed mesh generation into an HTTP error
+def abort_for_terrain_error(e):
+    if isinstance(e, InvalidRegionError):
+        logger.warning(f"Invalid region requested: {e}")
+        abort(400, description=str(e))
+    logger.error(f"STL generation failed: {e}")
+    abort(422, description=f"STL generation failed: {e}")
+
+# Common function to read the region of an STL request: the bounding box if one is given, otherwise the region around (lng, lat).
+# Returns the point the mesh is centred on, the region and the footprint lookup of the granules it may touch.
+def get_request_region(data, footprint_index):
+    bbox_region = get_bbox_region(data)
+    if bbox_region is not None:
+        bbox = bbox_region['bbox']
+        longitude, latitude = (bbox['west'] + bbox['east']) / 2, (bbox['south'] + bbox['north']) / 2
+        logger.info(f"Bounding box: {bbox}")
+        return longitude, latitude, bbox_region, lambda: footprint_index.intersecting(bbox)
+    longitude, latitude = get_longitude_latitude(data)
+    region = dict(get_region(data), merge=get_merge(data))
+    return longitude, latitude, region, lambda: footprint_index.covering(longitude, latitude)
+
+# Common function to describe the mesh request of a layer
+def get_layer_mesh_request(layer, data):
+    state = layer.state
+    longitude, latitude, region, find_locations = get_request_region(data, state.index)
+    detail = get_detail(data)
+    # Turn away unusable options before looking for data, so asynchronous jobs fail here rather than in a worker
+    try:
+        validate_mesh_options(**region, **detail)
+    except TerrainError as e:
+        abort_for_terrain_error(e)
 
-    # Collect relevant CSV files based on the request
+    # Use the CSV files named in the request, or every granule covering the point (or intersecting the box) if none are given
     csv_files = data.get('csv_files')
-    if not csv_files or len(csv_files) == 0:
-        return abort(400, description="CSV files are required for STL generation")
+    if csv_files and not isinstance(csv_files, list):
+        abort(400, description="csv_files must be a list of CSV file names")
+    if not csv_files:
+        csv_files = [location['csv'] for location in find_locations() if location.get('csv')]
+    if not csv_files:
+        logger.warning(f"No relevant location found for longitude: {longitude}, latitude: {latitude}")
+        abort(404, description="No data available for the specified location.")
 
-    # Make sure the CSV files exist and convert them to absolute paths
+    # Merge the points of every granule that has point data on disk. Names are resolved through the layer's
+    # locations, so requests cannot point outside the dataset directory.
     csv_file_paths = []
     for csv_file in csv_files:
-        csv_file_path = os.path.abspath(os.path.join(elevation_dir, csv_file))  # Use absolute paths
-        if not os.path.exists(csv_file_path):
-            logger.error(f"CSV file not found at path: {csv_file_path}")
-            return abort(404, description=f"CSV file not found: {csv_file}")
+        csv_file_path = state.csv_paths.get(os.path.normpath(csv_file)) if isinstance(csv_file, str) else None
+        if csv_file_path is None:
+            logger.warning(f"Unknown CSV file requested: {csv_file}")
+            continue
+        if not os.path.exists(csv_file_path) and not os.path.exists(points_path_for(csv_file_path)):
+            logger.warning(f"CSV file not found at path: {csv_file_path}")
+            continue
+        logger.info(f"Found relevant granule: {csv_file}")
         csv_file_paths.append(csv_file_path)
 
-    output_stl = os.path.join(elevation_dir, 'generated_terrain.stl')  # Output STL file
-
-    # Prepare command to run generate_stl.py with the necessary arguments
-    command = [
-        'python3', os.path.join(elevation_dir, 'csv', 'generate_stl.py'),
-        '--csv_files', *csv_file_paths,  # Pass absolute paths
-        '--lng', str(longitude),
-        '--lat', str(latitude),
-        '--output_stl', output_stl
-    ]
-
-    try:
-        logger.info(f"Running command: {' '.join(command)}")
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        if result.returncode == 0:
-            logger.info(f"STL file successfully generated: {output_stl}")
-            return send_file(output_stl, as_attachment=True, download_name='elevation_terrain.stl', mimetype='application/sla')
-        else:
-            logger.error(f"STL generation failed with error: {result.stderr}")
-            return abort(500, description=f"Error generating STL: {result.stderr}")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"STL generation process failed: {e.stderr}")
-        return abort(500, description=f"STL generation failed: {e.stderr}")
+    if not csv_file_paths:
+        logger.error(f"No point data found for any of the {len(csv_files)} relevant granule(s)")
+        abort(404, description="CSV file not found for the specified location.")
 
+    return get_mesh_request(csv_file_paths, longitude, latitude, layer.dataset.columns, region, detail)
 
-@app.route('/swot/generate_stl', methods=['POST'])
-def generate_stl():
+@app.route(f'/{LAYER}/generate_stl', methods=['POST'])
+def generate_stl(layer_name):
+    layer = get_layer(layer_name)
     data = request.json
 
     # Log the incoming request data
-    logger.info(f"Received POST request for STL generation with data: {data}")
+    logger.info(f"Received POST request for {layer.name} STL generation with data: {data}")
 
+    mesh_request = get_layer_mesh_request(layer, data)
+    stl_options = get_stl_options(data)
     try:
-        longitude = float(data.get('lng'))
-        latitude = float(data.get('lat'))
-        logger.info(f"Longitude: {longitude}, Latitude: {latitude}")
-    except (TypeError, ValueError) as e:
-        logger.error(f"Invalid longitude/latitude provided: {e}")
-        return abort(400, description="Longitude and latitude are required and must be valid numbers (lng, lat)")
+        terrain_mesh = get_mesh(layer.mesh_cache, mesh_request)
+    except TerrainError as e:
+        abort_for_terrain_error(e)
 
-    if not (longitude and latitude):
-        logger.warning("Longitude and latitude are missing from the request")
-        return abort(400, description="Longitude and latitude are required (lng, lat)")
-
-    # Check if the point is within any of the bounding boxes
-    relevant_location = None
-    for location in swot_locations:
-        bbox = location['bounding_box']
-        if is_point_in_bbox(longitude, latitude, bbox):
-            relevant_location = location
-            logger.info(f"Found relevant location: {relevant_location['name']}")
-            break
-
-    if not relevant_location:
-        logger.warning(f"No relevant location found for longitude: {longitude}, latitude: {latitude}")
-        return abort(404, description="No data available for the specified location.")
-
-    csv_file_path = os.path.join(swot_dir, relevant_location['csv'])
-
-    if not os.path.exists(csv_file_path):
-        logger.error(f"CSV file not found for location: {relevant_location['name']} at path: {csv_file_path}")
-        return abort(404, description="CSV file not found for the specified location.")
-
-    output_stl = os.path.join(csv_dir, 'generated_terrain.stl')  # Output STL file
+    logger.info(f"STL generated ({len(terrain_mesh)} triangles) from {len(mesh_request.csv_file_paths)} CSV file(s)")
+    return send_stl(terrain_mesh, layer.dataset.stl_name, **stl_options)
 
-    # Prepare command to run generate_stl.py with the necessary arguments
-    command = [
-        'python3', os.path.join(csv_dir, 'generate_stl.py'),
-        '--csv_files', csv_file_path,
-        '--lng', str(longitude),
-        '--lat', str(latitude),
-        '--output_stl', output_stl
-    ]
 
+# Common function to queue a mesh request, reusing a cached mesh or an identical unfinished job
+def submit_mesh_job(layer, mesh_request):
+    cached = layer.mesh_cache.get(mesh_request.key)
     try:
-        logger.info(f"Running command: {' '.join(command)}")
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        if result.returncode == 0:
-            logger.info(f"STL file successfully generated: {output_stl}")
-            return send_file(output_stl, as_attachment=True, download_name='terrain.stl', mimetype='application/sla')
+        if cached is not None:
+            job = stl_jobs.add_result(mesh_request.key, layer.name, cached)
         else:
-            logger.error(f"STL generation failed with error: {result.stderr}")
-            return abort(500, description=f"Error generating STL: {result.stderr}")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"STL generation process failed: {e.stderr}")
-        return abort(500, description=f"STL generation failed: {e.stderr}")
+            job = stl_jobs.submit(
+                mesh_request.key, layer.name, generate_mesh,
+                mesh_request.csv_file_paths, mesh_request.longitude, mesh_request.latitude, **mesh_request.options
+            )
+    except JobQueueFull as e:
+        logger.warning(f"STL job rejected: {e}")
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(STL_JOB_RETRY_AFTER)
+        return response
+
+    logger.info(f"STL job {job.id} is {job.state}")
+    response = jsonify(get_job_status(layer, job))
+    response.status_code = 202
+    response.headers['Location'] = f"/{layer.name}/generate_stl/jobs/{job.id}"
+    return response
+
+# Common function to describe a job, with the URLs to poll it and fetch its mesh
+def get_job_status(layer, job):
+    status = stl_jobs.status(job)
+    status['status_url'] = f"/{layer.name}/generate_stl/jobs/{job.id}"
+    status['result_url'] = f"/{layer.name}/generate_stl/jobs/{job.id}/result"
+    return status
+
+# Common function to turn away job requests when jobs are off (several workers without sticky routing)
+def require_stl_jobs():
+    if not stl_jobs_enabled:
+        abort(404, description="STL jobs are not available with several workers; use POST /generate_stl instead")
+
+# Common function to look up a job of a layer
+def get_job(layer, job_id):
+    require_stl_jobs()
+    job = stl_jobs.get(job_id)
+    if job is None or job.layer != layer.name:
+        abort(404, description="Job not found (it may have expired)")
+    return job
+
+@app.route(f'/{LAYER}/generate_stl/jobs', methods=['POST'])
+def submit_stl_job(layer_name):
+    layer = get_layer(layer_name)
+    require_stl_jobs()
+    data = request.json
+    logger.info(f"Received POST request for a {layer.name} STL job with data: {data}")
+    return submit_mesh_job(layer, get_layer_mesh_request(layer, data))
+
+@app.route(f'/{LAYER}/generate_stl/jobs/<job_id>', methods=['GET'])
+def get_stl_job(layer_name, job_id):
+    layer = get_layer(layer_name)
+    return jsonify(get_job_status(layer, get_job(layer, job_id)))
+
+# Serves the mesh of a finished job (format and gzip are query parameters)
+@app.route(f'/{LAYER}/generate_stl/jobs/<job_id>/result', methods=['GET'])
+def get_stl_job_result(layer_name, job_id):
+    layer = get_layer(layer_name)
+    job = get_job(layer, job_id)
+    if not job.finished:
+        response = jsonify(get_job_status(layer, job))
+        response.status_code = 202
+        return response
+    if job.state == FAILED:
+        if isinstance(job.error, TerrainError):
+            abort_for_terrain_error(job.error)
+        logger.error(f"STL job {job.id} failed: {job.error}")
+        abort(500, description="STL generation failed")
+
+    # Keep the mesh for synchronous requests too
+    terrain_mesh = layer.mesh_cache.put(job.key, job.result)
+    return send_stl(terrain_mesh, layer.dataset.stl_name, **get_stl_options(request.args))
+
+
+# Water-surface time series around (lng, lat): the mean, median and number of the values within the region
+# (radius, shape, units as for STLs) of every pass over it, oldest first, optionally between start and end
+# (ISO dates of acquisition). Rows are listed in the order of 'columns'. Only served for layers whose dataset
+# has time-stamped granules (SWOT); other layers answer 404.
+@app.route(f'/{TIME_SERIES_LAYER}/timeseries', methods=['GET'])
+def get_timeseries(layer_name):
+    layer = get_layer(layer_name)
+    longitude, latitude = get_longitude_latitude(request.args)
+    region = get_region(request.args)
+    try:
+        start = parse_time(request.args['start']) if request.args.get('start') else None
+        end = parse_time(request.args['end'], end_of_day=True) if request.args.get('end') else None
+    except QueryError as e:
+        abort(400, description=str(e))
+
+    try:
+        series = timeseries.series(
+            layer.state.timeseries_index, layer.dataset.columns, longitude, latitude, start=start, end=end, **region
+        )
+    except InvalidRegionError as e:
+        abort(400, description=str(e))
+    except TerrainError as e:
+        logger.error(f"Time series failed: {e}")
+        abort(422, description=f"Time series failed: {e}")
+    return jsonify({
+        'lng': longitude,
+        'lat': latitude,
+        **region,
+        'columns': SERIES_COLUMNS,
+        'series': series,
+    })
+
+
+@app.route('/stl_jobs/stats', methods=['GET'])
+def get_stl_job_stats():
+    return jsonify(stl_jobs.stats())
+
+
+@app.route('/stl_cache/stats', methods=['GET'])
+def get_stl_cache_stats():
+    return jsonify({name: layer.mesh_cache.stats() for name, layer in layers.items()})
+
+
+@app.route('/tile_cache/stats', methods=['GET'])
+def get_tile_cache_stats():
+    return jsonify({name: layer.tiles.stats() for name, layer in layers.items()})
+
+
+@app.route('/timeseries_cache/stats', methods=['GET'])
+def get_timeseries_cache_stats():
+    return jsonify(timeseries.cache.stats())
+
+
+# Every request is timed: its stage spans (see timing.py) go into a Server-Timing header, and its duration
+# into the /metrics histograms. Streamed bodies (STLs) are encoded after the headers are sent, so their
+# 'stl.encode' time only shows up in /metrics.
+REQUEST_SECONDS = timing.REGISTRY.histogram(
+    'http_request_duration_seconds', 'Time to handle a request, until its response starts.', ('endpoint', 'layer', 'method', 'status')
+)
+REQUESTS = timing.REGISTRY.counter('http_requests_total', 'Requests handled.', ('endpoint', 'layer', 'method', 'status'))
+
+
+@app.before_request
+def start_request_timing():
+    g.request_started = time.perf_counter()
+    g.spans, g.spans_token = timing.start_collecting()
+
+    # Profiling never changes the outcome of a request; if it cannot be done the reason is sent back instead
+    profiler_name = request.headers.get('X-Profile')
+    if profiler_name and PROFILE_REQUESTS:
+        try:
+            profiler = RequestProfiler(profiler_name.strip().lower())
+            profiler.start()
+            g.profiler = profiler
+        except ProfilerUnavailable as e:
+            g.profile_error = str(e)
+
+
+@app.after_request
+def finish_request_timing(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        response.headers['X-Profile-File'] = profiler.dump(PROFILE_DIR, request.endpoint or 'unmatched')
+    elif 'profile_error' in g:
+        response.headers['X-Profile-Error'] = g.profile_error
+
+    elapsed = time.perf_counter() - g.request_started
+    response.headers['Server-Timing'] = timing.server_timing(g.spans, elapsed)
+    response.headers['Timing-Allow-Origin'] = '*'  # Lets the map read Server-Timing across origins
+    labels = {
+        'endpoint': request.endpoint or 'unmatched',
+        'layer': (request.view_args or {}).get('layer_name', ''),
+        'method': request.method,
+        'status': response.status_code,
+    }
+    REQUEST_SECONDS.observe(elapsed, **labels)
+    REQUESTS.inc(**labels)
+    return response
+
+
+@app.teardown_request
+def stop_request_timing(error=None):
+    # after_request is skipped when a request fails with an unhandled error, so clean up here as well
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+    token = g.pop('spans_token', None)
+    if token is not None:
+        timing.stop_collecting(token)
+
+
+# Cache and job queue statistics are exported with the metrics: hit/miss/eviction/write counts as counters
+# (with a '_total' suffix), sizes and limits as gauges
+COUNTER_STATS = ('hits', 'misses', 'evictions', 'disk_hits', 'disk_writes', 'disk_evictions')
+
+
+def collect_stats_metrics():
+    families = OrderedDict()
+
+    def add(prefix, stats, labels):
+        for key, value in stats.items():
+            if key in COUNTER_STATS:
+                name, metric_type = f'{prefix}_{key}_total', 'counter'
+            else:
+                name, metric_type = f'{prefix}_{key}', 'gauge'
+            family = families.setdefault(name, (metric_type, f"{prefix.replace('_', ' ').capitalize()} {key.replace('_', ' ')}.", []))
+            family[2].append((labels, int(value)))
+
+    for name, layer in layers.items():
+        add('stl_cache', layer.mesh_cache.stats(), {'layer': name})
+        for cache, stats in layer.tiles.stats().items():
+            add('tile_cache', stats, {'layer': name, 'cache': cache})
+    add('timeseries_cache', timeseries.cache.stats(), {})
+    add('index_cache', index_cache.stats(), {})
+    job_stats = stl_jobs.stats()
+    families['stl_jobs'] = ('gauge', 'STL jobs by state.', [({'state': state}, job_stats.pop(state)) for state in (QUEUED, RUNNING, DONE, FAILED)])
+    add('stl_jobs', job_stats, {})
+    return [(name, metric_type, help, samples) for name, (metric_type, help, samples) in families.items()]
+
+
+timing.REGISTRY.add_collector(collect_stats_metrics)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(timing.REGISTRY.render(), content_type=timing.PROMETHEUS_CONTENT_TYPE)
 
 
 if __name__ == '__main__':
-    # Enable debugging, auto-restart the server if code changes
-    app.run(host='0.0.0.0', port=5001, debug=True)
+    # Development server: enable debugging, auto-restart the server if code changes.
+    # For production run wsgi.py (or gunicorn -c gunicorn.conf.py) instead.
+    # Requests are handled on separate threads; STL output is per-request so this is safe.
+    app.run(host='0.0.0.0', port=5001, debug=True, threaded=True)
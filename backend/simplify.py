@@ -0,0 +1,85 @@
+import numpy as np
+from scipy.spatial import Delaunay
+
+
+def snake_order(points2D):
+    """Returns an ordering of the points that sweeps them row by row in alternating directions.
+
+    Point location walks from the previous answer, so querying neighbouring points in turn is much faster.
+    """
+    num_rows = max(1, int(np.sqrt(len(points2D))) // 2)
+    y = points2D[:, 1]
+    span = np.ptp(y) or 1.0
+    rows = np.minimum(((y - y.min()) / span * num_rows).astype(np.int64), num_rows - 1)
+    x = np.where(rows % 2 == 0, points2D[:, 0], -points2D[:, 0])
+    return np.lexsort((x, rows))
+
+
+def surface_errors(tri, heights, points2D, z):
+    """Returns the vertical error of each point against the triangulated surface (tri with vertex heights),
+    and the triangle each point falls in (-1 for points on the outer boundary)."""
+    simplices = tri.find_simplex(points2D)
+    errors = np.zeros(len(points2D))
+    inside = simplices >= 0
+
+    # Barycentric coordinates of each point in its triangle, then the surface height there
+    transform = tri.transform[simplices[inside]]
+    barycentric = np.einsum('ijk,ik->ij', transform[:, :2], points2D[inside] - transform[:, 2])
+    weights = np.column_stack((barycentric, 1 - barycentric.sum(axis=1)))
+    corners = heights[tri.simplices[simplices[inside]]]
+    errors[inside] = np.abs(z[inside] - (weights * corners).sum(axis=1))
+    return errors, simplices
+
+
+def simplify_surface(points2D, z, initial, max_vertices=None, tolerance=None):
+    """Greedy-insertion terrain simplification of a height field.
+
+    Starts from the initial vertices (the outline, so walls and base keep their shape) and repeatedly
+    inserts, for every triangle of the current Delaunay mesh, the point furthest above or below it.
+    Stops when every point is within tolerance of the surface or max_vertices are used.
+    Returns the sorted indices of the kept points.
+    """
+    if max_vertices is None:
+        max_vertices = len(points2D)
+    order = snake_order(points2D)
+    selected = np.zeros(len(points2D), dtype=bool)
+    selected[initial] = True
+
+    while True:
+        inserted = np.flatnonzero(selected)
+        budget = max_vertices - len(inserted)
+        candidates = order[~selected[order]]
+        if budget <= 0 or candidates.size == 0:
+            break
+
+        errors, simplices = surface_errors(Delaunay(points2D[inserted]), z[inserted], points2D[candidates], z[candidates])
+        keep = simplices >= 0
+        if tolerance is not None:
+            keep &= errors > tolerance
+        candidates, errors, simplices = candidates[keep], errors[keep], simplices[keep]
+        if candidates.size == 0:
+            break
+
+        # Worst point of each triangle: sort by triangle, then by descending error
+        by_triangle = np.lexsort((-errors, simplices))
+        first = np.ones(len(by_triangle), dtype=bool)
+        first[1:] = simplices[by_triangle][1:] != simplices[by_triangle][:-1]
+        worst = by_triangle[first]
+
+        if len(worst) > budget:
+            worst = worst[np.argsort(-errors[worst], kind='stable')[:budget]]
+        selected[candidates[worst]] = True
+
+    return np.flatnonzero(selected)
+
+
+def vertex_budget(max_triangles, num_boundary):
+    """Returns how many vertices a closed terrain mesh with num_boundary outline vertices can use
+    while staying within max_triangles (top surface + two per wall segment + base)."""
+    # A triangulation of k points with b on its outline has 2k - b - 2 triangles, the walls 2b and the base b - 2
+    return (max_triangles - 2 * num_boundary + 4) // 2
+
+
+def min_triangles(num_boundary):
+    """Returns the triangle count of the coarsest closed mesh over an outline (only the outline vertices)."""
+    return 4 * num_boundary - 4
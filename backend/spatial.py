@@ -0,0 +1,212 @@
+import os
+import numpy as np
+from scipy.spatial import cKDTree
+from lrucache import LRUCache
+
+# Supported query shapes and units for selecting points around a location
+SHAPES = ('circle', 'box')
+UNITS = ('degrees', 'metres', 'meters')
+
+# Default budget of the spatial index cache (the server sets its own, see INDEX_CACHE_MAX_BYTES)
+DEFAULT_INDEX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Approximate length of one degree of latitude (and of longitude at the equator) in metres
+METRES_PER_DEGREE = 111320.0
+
+
+class RegionError(ValueError):
+    """Raised when a query region (radius, shape or units) is invalid."""
+
+
+def validate_region(radius, shape, units):
+    """Checks the radius, shape and units of a point query and raises RegionError if they are unusable."""
+    if shape not in SHAPES:
+        raise RegionError(f"Unknown shape '{shape}'. Expected one of: {', '.join(SHAPES)}")
+    if units not in UNITS:
+        raise RegionError(f"Unknown units '{units}'. Expected one of: {', '.join(UNITS)}")
+    if not np.isfinite(radius) or radius <= 0:
+        raise RegionError(f"Radius must be a positive number, got {radius}")
+
+
+def validate_bbox(bbox):
+    """Checks a {'west', 'east', 'south', 'north'} bounding box in degrees and raises RegionError if it is unusable."""
+    if not all(np.isfinite(bbox[edge]) for edge in ('west', 'east', 'south', 'north')):
+        raise RegionError("Bounding box edges must be finite numbers")
+    if not (-90 <= bbox['south'] < bbox['north'] <= 90):
+        raise RegionError(f"Bounding box south ({bbox['south']}) must be below north ({bbox['north']}) and within [-90, 90]")
+    if not bbox['west'] < bbox['east']:
+        raise RegionError(f"Bounding box west ({bbox['west']}) must be less than east ({bbox['east']})")
+
+
+def region_extent(lat, radius, units):
+    """Returns the (longitude, latitude) half-extent of a region in degrees."""
+    if units == 'degrees':
+        return radius, radius
+    half_lat = radius / METRES_PER_DEGREE
+    half_lng = radius / (METRES_PER_DEGREE * max(np.cos(np.radians(lat)), 1e-6))
+    return half_lng, half_lat
+
+
+def region_mask(lons, lats, lng, lat, radius, shape='circle', units='degrees'):
+    """Returns a boolean mask of the points that fall inside the region around (lng, lat)."""
+    half_lng, half_lat = region_extent(lat, radius, units)
+    dx = lons - lng
+    dy = lats - lat
+    if shape == 'box':
+        return (np.abs(dx) < half_lng) & (np.abs(dy) < half_lat)
+    if units == 'degrees':
+        return np.sqrt(dx ** 2 + dy ** 2) < radius
+    # A circle in metres is an ellipse in degrees (longitude degrees shrink with latitude)
+    return np.sqrt((dx / half_lng) ** 2 + (dy / half_lat) ** 2) < 1
+
+
+def bbox_mask(lons, lats, bbox):
+    """Returns a boolean mask of the points that fall inside a {'west', 'east', 'south', 'north'} bounding box."""
+    return (lons >= bbox['west']) & (lons <= bbox['east']) & (lats >= bbox['south']) & (lats <= bbox['north'])
+
+
+def point_spacing(lons, lats, sample=1000):
+    """Returns the typical distance in degrees between neighbouring points (median nearest-neighbour distance of a sample)."""
+    points = np.column_stack((lons, lats))
+    if len(points) < 2:
+        return 0.0
+    step = max(1, len(points) // sample)
+    distances, _ = cKDTree(points).query(points[::step], k=2)
+    return float(np.median(distances[:, 1]))
+
+
+class PointIndex:
+    """KD-tree over the (longitude, latitude) of one granule's points."""
+
+    def __init__(self, lons, lats, values, tree=None):
+        self.lons = lons
+        self.lats = lats
+        self.values = values
+        self.tree = cKDTree(np.column_stack((lons, lats))) if tree is None else tree
+
+    def __len__(self):
+        return len(self.lons)
+
+    @property
+    def nbytes(self):
+        # The tree's copy of the coordinates and its index, plus the arrays held in memory (memory-mapped
+        # point files are left to the page cache)
+        arrays = (self.lons, self.lats, self.values)
+        return self.tree.data.nbytes + self.tree.indices.nbytes + sum(
+            array.nbytes for array in arrays if not isinstance(array, np.memmap)
+        )
+
+    def with_values(self, values):
+        """Returns an index over the same points (sharing the tree) with other values, e.g. another aggregate."""
+        return PointIndex(self.lons, self.lats, values, tree=self.tree)
+
+    def query(self, lng, lat, radius, shape='circle', units='degrees'):
+        """Returns the indices (in file order) of the points inside the region around (lng, lat)."""
+        half_lng, half_lat = region_extent(lat, radius, units)
+
+        # The tree works in degrees, so fetch every candidate inside the enclosing circle/square
+        # and then apply the exact region test to just those candidates
+        p = np.inf if shape == 'box' else 2
+        candidates = np.asarray(self.tree.query_ball_point([lng, lat], r=max(half_lng, half_lat), p=p), dtype=np.intp)
+        if candidates.size == 0:
+            return candidates
+        candidates.sort()
+
+        inside = region_mask(self.lons[candidates], self.lats[candidates], lng, lat, radius, shape=shape, units=units)
+        return candidates[inside]
+
+    def select(self, lng, lat, radius, shape='circle', units='degrees'):
+        """Returns the lon/lat/value arrays of the points inside the region around (lng, lat)."""
+        indices = self.query(lng, lat, radius, shape=shape, units=units)
+        return self.lons[indices], self.lats[indices], self.values[indices]
+
+    def query_bbox(self, bbox):
+        """Returns the indices (in file order) of the points inside a {'west', 'east', 'south', 'north'} bounding box."""
+        # Fetch the candidates of the square around the box centre that encloses it, then keep those inside the box
+        lng, lat = (bbox['west'] + bbox['east']) / 2, (bbox['south'] + bbox['north']) / 2
+        half = max(bbox['east'] - lng, bbox['north'] - lat)
+        candidates = np.asarray(self.tree.query_ball_point([lng, lat], r=half, p=np.inf), dtype=np.intp)
+        if candidates.size == 0:
+            return candidates
+        candidates.sort()
+        return candidates[bbox_mask(self.lons[candidates], self.lats[candidates], bbox)]
+
+    def select_bbox(self, bbox):
+        """Returns the lon/lat/value arrays of the points inside a bounding box."""
+        indices = self.query_bbox(bbox)
+        return self.lons[indices], self.lats[indices], self.values[indices]
+
+
+# Indexes are built the first time a granule is queried and kept, least recently used first out, within a
+# byte budget. Keys include the source file's mtime, so an index is rebuilt when its file changes and the
+# stale one ages out.
+index_cache = LRUCache(DEFAULT_INDEX_CACHE_BYTES)
+
+
+def get_index(source_path, load):
+    """Returns the cached PointIndex for a source file, building it with load() -> (lons, lats, values) if needed."""
+    key = (source_path, os.stat(source_path).st_mtime_ns)
+    return index_cache.get_or_create(key, lambda: PointIndex(*load()))
+
+
+def clear_index_cache():
+    """Drops every cached index (they are rebuilt on the next query)."""
+    index_cache.clear()
+
+
+class FootprintIndex:
+    """Sorted-interval index over the bounding boxes of a dataset's granules (the entries of locations.json).
+
+    Footprints are sorted by their west edge, so a lookup binary-searches the range of granules that can
+    reach the query longitude and then tests only that slice with vectorized comparisons.
+    """
+
+    def __init__(self, locations):
+        self.locations = list(locations)
+        boxes = np.array([
+            [
+                loc['bounding_box']['southwest']['lng'],
+                loc['bounding_box']['southwest']['lat'],
+                loc['bounding_box']['northeast']['lng'],
+                loc['bounding_box']['northeast']['lat'],
+            ]
+            for loc in self.locations
+        ], dtype=np.float64).reshape(-1, 4)
+
+        self.order = np.argsort(boxes[:, 0], kind='stable')
+        self.west, self.south, self.east, self.north = boxes[self.order].T
+        self.max_width = float(np.max(self.east - self.west)) if len(self.locations) else 0.0
+
+    def __len__(self):
+        return len(self.locations)
+
+    def _candidates(self, west, east):
+        # Only footprints whose west edge lies in [west - max_width, east] can overlap [west, east]
+        start = np.searchsorted(self.west, west - self.max_width, side='left')
+        stop = np.searchsorted(self.west, east, side='right')
+        return slice(start, stop)
+
+    def _matches(self, window, hits):
+        positions = self.order[window][hits]
+        positions.sort()  # Report granules in locations.json order
+        return [self.locations[i] for i in positions]
+
+    def covering(self, lng, lat):
+        """Returns every granule whose bounding box contains the point (lng, lat)."""
+        window = self._candidates(lng, lng)
+        hits = (
+            (self.east[window] >= lng) &
+            (self.south[window] <= lat) &
+            (self.north[window] >= lat)
+        )
+        return self._matches(window, hits)
+
+    def intersecting(self, bbox):
+        """Returns every granule whose bounding box intersects bbox ({'west', 'east', 'south', 'north'})."""
+        window = self._candidates(bbox['west'], bbox['east'])
+        hits = (
+            (self.east[window] >= bbox['west']) &
+            (self.south[window] <= bbox['north']) &
+            (self.north[window] >= bbox['south'])
+        )
+        return self._matches(window, hits)
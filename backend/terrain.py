@@ -0,0 +1,696 @@
+import io
+import math
+import os
+import re
+import zlib
+import numpy as np
+from scipy.spatial import Delaunay, ConvexHull
+import pointstore
+import pyramid
+import simplify
+import spatial
+from timing import span, timed_iter
+
+# Column names (longitude, latitude, value) used by each dataset's CSV files
+SWOT_COLUMNS = ('Longitude', 'Latitude', 'Water_Level')
+ELEVATION_COLUMNS = ('longitude', 'latitude', 'elevation')
+WATER_LEVEL_COLUMNS = ('longitude', 'latitude', 'water_level')
+
+# Default region around the requested point that is included in the mesh
+DEFAULT_RADIUS = 0.1
+DEFAULT_SHAPE = 'circle'
+DEFAULT_UNITS = 'degrees'
+
+# Upper bound on the points taken from each granule; larger regions are read from a coarser pyramid level
+DEFAULT_MAX_POINTS = 250_000
+
+# Meshing modes: Delaunay triangulation of the scattered points, or two triangles per cell of the ingest grid
+MESH_MODES = ('delaunay', 'grid')
+DEFAULT_MESH_MODE = 'delaunay'
+
+# How the points of overlapping granules are merged: the most recent granule wins, or the points of every
+# granule are averaged. The merge grid is kept within MERGE_MAX_CELLS cells.
+MERGE_POLICIES = ('latest', 'mean')
+DEFAULT_MERGE = 'latest'
+MERGE_MAX_CELLS = 2 ** 21
+
+# Acquisition time in granule file names, e.g. ..._20240927T164805_...
+GRANULE_TIME_PATTERN = re.compile(r'\d{8}T\d{6}')
+
+# Pixel size in metres in granule file names, e.g. ..._Raster_100m_...
+GRANULE_RESOLUTION_PATTERN = re.compile(r'_(\d+)m_')
+
+# Model dimensions in millimetres (footprint is XY_SIZE x XY_SIZE, relief is Z_SIZE)
+XY_SIZE = 150
+Z_SIZE = 30
+
+# Binary STL layout: an 80-byte header, a little-endian uint32 triangle count and one 50-byte record per
+# triangle (normal, three vertices, attribute byte count). Same record layout as numpy-stl's Mesh.dtype.
+STL_HEADER_SIZE = 80
+STL_RECORD_DTYPE = np.dtype([
+    ('normals', '<f4', (3,)),
+    ('vectors', '<f4', (3, 3)),
+    ('attr', '<u2', (1,)),
+])
+
+# Number of triangles encoded per chunk when streaming an STL
+STL_CHUNK_TRIANGLES = 65536
+
+
+class TerrainError(ValueError):
+    """Base error for anything that prevents a terrain mesh from being generated."""
+
+
+class DataFormatError(TerrainError):
+    """Raised when a data file is missing one of the expected columns."""
+
+
+class InvalidRegionError(TerrainError):
+    """Raised when the requested region (radius, shape or units) or level of detail is invalid."""
+
+
+class InsufficientDataError(TerrainError):
+    """Raised when too few points are near the requested location to triangulate."""
+
+
+class DegenerateDataError(TerrainError):
+    """Raised when the selected points cannot be triangulated (e.g. they are colinear)."""
+
+
+def load_csv_data(csv_file, columns=SWOT_COLUMNS):
+    """Loads every point of a CSV file as lon/lat/value arrays."""
+    try:
+        return pointstore.read_csv_columns(csv_file, columns)
+    except KeyError as e:
+        raise DataFormatError(str(e))
+
+
+def load_granule_index(csv_file, columns=SWOT_COLUMNS, factor=1, aggregate=pyramid.DEFAULT_AGGREGATE):
+    """Returns the spatial index for one granule, preferring its memory-mapped binary point file over the CSV.
+
+    factor selects a pyramid level of the binary point file; aggregate picks its mean, min or max values.
+    """
+    points_path = pointstore.points_path_for(csv_file)
+    if factor != 1:
+        level_path = pyramid.level_path(points_path, factor)
+        value_row = {'mean': pointstore.VALUE, 'min': pointstore.VALUE_MIN, 'max': pointstore.VALUE_MAX}[aggregate]
+
+        def load_level():
+            points = pointstore.load_points(level_path)
+            return points[pointstore.LON], points[pointstore.LAT], points[pointstore.VALUE]
+        # One tree per level file serves every aggregate
+        index = spatial.get_index(level_path, load_level)
+        if value_row == pointstore.VALUE:
+            return index
+        return index.with_values(pointstore.load_points(level_path)[value_row])
+
+    if pointstore.is_current(points_path, csv_file):
+        def load():
+            points = pointstore.load_points(points_path)
+            return points[pointstore.LON], points[pointstore.LAT], points[pointstore.VALUE]
+        return spatial.get_index(points_path, load)
+    return spatial.get_index(csv_file, lambda: load_csv_data(csv_file, columns=columns))
+
+
+def choose_granule_level(csv_file, lng, lat, columns=SWOT_COLUMNS, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS,
+                         max_points=DEFAULT_MAX_POINTS, aggregate=pyramid.DEFAULT_AGGREGATE, bbox=None):
+    """Returns the pyramid level factor of the finest level with at most max_points points in the region.
+
+    bbox, if given, is the region instead of the one around (lng, lat).
+    """
+    points_path = pointstore.points_path_for(csv_file)
+    if max_points is None or not pointstore.is_current(points_path, csv_file):
+        return 1
+    factors = pyramid.find_levels(points_path)
+    if len(factors) == 1:
+        return 1
+
+    # Count the region on the (small) coarsest level and extrapolate to the finer ones
+    coarsest = load_granule_index(csv_file, columns=columns, factor=factors[-1], aggregate=aggregate)
+    if bbox is not None:
+        coarse_count = len(coarsest.query_bbox(bbox))
+    else:
+        coarse_count = len(coarsest.query(lng, lat, radius, shape=shape, units=units))
+    return pyramid.choose_level(factors, coarse_count, max_points)
+
+
+def load_granule_data(csv_file, lng, lat, columns=SWOT_COLUMNS, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS,
+                      max_points=DEFAULT_MAX_POINTS, aggregate=pyramid.DEFAULT_AGGREGATE, bbox=None):
+    """Loads the points of one granule that fall inside the region around (lng, lat), or inside bbox if given,
+    from the pyramid level that fits max_points."""
+    region = {'radius': radius, 'shape': shape, 'units': units}
+    with span('stl.load'):
+        factor = choose_granule_level(csv_file, lng, lat, columns=columns, max_points=max_points, aggregate=aggregate, bbox=bbox, **region)
+        index = load_granule_index(csv_file, columns=columns, factor=factor, aggregate=aggregate)
+    with span('stl.filter'):
+        if bbox is not None:
+            return index.select_bbox(bbox)
+        return index.select(lng, lat, **region)
+
+
+def validate_detail(max_points, aggregate):
+    """Raises InvalidRegionError if max_points or aggregate is unusable."""
+    if max_points is not None and max_points < 4:
+        raise InvalidRegionError(f"max_points must be at least 4, got {max_points}")
+    if aggregate not in pyramid.AGGREGATES:
+        raise InvalidRegionError(f"Unknown aggregate '{aggregate}'. Expected one of: {', '.join(pyramid.AGGREGATES)}")
+
+
+def load_points(csv_files, lng, lat, columns=SWOT_COLUMNS, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS,
+                max_points=DEFAULT_MAX_POINTS, aggregate=pyramid.DEFAULT_AGGREGATE, merge=DEFAULT_MERGE, progress=None):
+    """Merges the points inside the region around (lng, lat) from every granule into three NumPy arrays.
+
+    max_points (None for full resolution) bounds the points read from each granule; aggregate ('mean',
+    'min' or 'max') is how values are combined on coarser pyramid levels. Overlapping granules are merged
+    with the merge policy, as in load_bbox_points.
+    """
+    try:
+        spatial.validate_region(radius, shape, units)
+    except spatial.RegionError as e:
+        raise InvalidRegionError(str(e))
+    validate_detail(max_points, aggregate)
+    if merge not in MERGE_POLICIES:
+        raise InvalidRegionError(f"Unknown merge policy '{merge}'. Expected one of: {', '.join(MERGE_POLICIES)}")
+
+    half_lng, half_lat = spatial.region_extent(lat, radius, units)
+    bbox = {'west': lng - half_lng, 'east': lng + half_lng, 'south': lat - half_lat, 'north': lat + half_lat}
+    return merge_granules(csv_files, bbox, lambda csv_file: load_granule_data(
+        csv_file, lng, lat, columns=columns, radius=radius, shape=shape, units=units, max_points=max_points, aggregate=aggregate
+    ), merge=merge, progress=progress)
+
+
+def granule_time(csv_file):
+    """Returns the acquisition time in a granule's file name (e.g. '20240927T164805'), or '' if it has none."""
+    match = GRANULE_TIME_PATTERN.search(os.path.basename(csv_file))
+    return match.group(0) if match else ''
+
+
+def merge_order(csv_file):
+    """Sort key that puts granules newest first and, among products of the same acquisition (e.g. the 100 m
+    and 250 m rasters of a tile), the finest first (with reverse=True)."""
+    resolution = GRANULE_RESOLUTION_PATTERN.search(os.path.basename(csv_file))
+    return granule_time(csv_file), (-int(resolution.group(1)) if resolution else 0)
+
+
+class MergeRaster:
+    """Grid over a bounding box that records which cells earlier granules covered, or accumulates their points.
+
+    Cells are about the spacing of the first granule's points; the grid is coarsened if it would exceed
+    MERGE_MAX_CELLS, so its memory does not depend on how many points are merged into it.
+    """
+
+    def __init__(self, bbox, spacing):
+        self.west, self.south = bbox['west'], bbox['south']
+        width, height = bbox['east'] - bbox['west'], bbox['north'] - bbox['south']
+        cell = max(spacing, math.sqrt(width * height / MERGE_MAX_CELLS), 1e-9)
+        self.cell = cell
+        self.shape = (int(height / cell) + 1, int(width / cell) + 1)
+        self.covered = np.zeros(self.shape, dtype=bool)
+        self.sums = None
+
+    def cells(self, lons, lats):
+        """Returns the flat cell index of every point."""
+        rows = np.clip(((lats - self.south) / self.cell).astype(np.intp), 0, self.shape[0] - 1)
+        cols = np.clip(((lons - self.west) / self.cell).astype(np.intp), 0, self.shape[1] - 1)
+        return rows * self.shape[1] + cols
+
+    def is_covered(self, cells):
+        """Returns whether each cell or one of its eight neighbours is covered (so gaps between points count as covered)."""
+        padded = np.pad(self.covered, 1)
+        rows, cols = np.divmod(cells, self.shape[1])
+        near = np.zeros(len(cells), dtype=bool)
+        for dr in (0, 1, 2):
+            for dc in (0, 1, 2):
+                near |= padded[rows + dr, cols + dc]
+        return near
+
+    def cover(self, cells):
+        self.covered.flat[cells] = True
+
+    def add(self, cells, lons, lats, values):
+        """Adds points to the per-cell sums that mean() averages."""
+        if self.sums is None:
+            self.sums = np.zeros((4, self.covered.size))
+        for row, column in enumerate((lons, lats, values, np.ones(len(cells)))):
+            self.sums[row] += np.bincount(cells, weights=column, minlength=self.covered.size)
+
+    def mean(self):
+        """Returns the lon/lat/value means of every cell that received points."""
+        if self.sums is None:
+            return np.array([]), np.array([]), np.array([])
+        filled = np.flatnonzero(self.sums[3])
+        counts = self.sums[3, filled]
+        return self.sums[0, filled] / counts, self.sums[1, filled] / counts, self.sums[2, filled] / counts
+
+
+def load_bbox_points(csv_files, bbox, columns=SWOT_COLUMNS, max_points=DEFAULT_MAX_POINTS, aggregate=pyramid.DEFAULT_AGGREGATE,
+                     merge=DEFAULT_MERGE, progress=None):
+    """Merges the points inside bbox from every granule (see merge_granules)."""
+    try:
+        spatial.validate_bbox(bbox)
+    except spatial.RegionError as e:
+        raise InvalidRegionError(str(e))
+    validate_detail(max_points, aggregate)
+    if merge not in MERGE_POLICIES:
+        raise InvalidRegionError(f"Unknown merge policy '{merge}'. Expected one of: {', '.join(MERGE_POLICIES)}")
+
+    lng, lat = (bbox['west'] + bbox['east']) / 2, (bbox['south'] + bbox['north']) / 2
+    return merge_granules(csv_files, bbox, lambda csv_file: load_granule_data(
+        csv_file, lng, lat, columns=columns, max_points=max_points, aggregate=aggregate, bbox=bbox
+    ), merge=merge, progress=progress)
+
+
+def merge_granules(csv_files, bbox, read, merge=DEFAULT_MERGE, progress=None):
+    """Merges the points that read(csv_file) returns for every granule, reading one granule at a time.
+
+    Granules are read newest first (by the time in their file name), the finest product of an acquisition
+    first. With merge='latest' the points of a later-read granule are dropped where an earlier one already
+    has data, so overlapping passes and products never interleave; with 'mean' the points of every granule
+    are averaged per cell of a grid about as fine as the data. bbox encloses every point read. Only one
+    granule's points are held at once, besides the merged result, so memory follows the region rather than
+    the granules.
+    """
+    ordered = sorted(csv_files, key=merge_order, reverse=True)
+    raster = None
+    all_lons, all_lats, all_values = [], [], []
+
+    for number, csv_file in enumerate(ordered):
+        report_progress(progress, 'loading', 0.5 * number / len(ordered))
+        lons, lats, values = read(csv_file)
+        if len(lons) == 0:
+            continue
+        with span('stl.merge'):
+            if raster is None:
+                raster = MergeRaster(bbox, spatial.point_spacing(lons, lats))
+            cells = raster.cells(lons, lats)
+
+            if merge == 'mean':
+                raster.add(cells, lons, lats, values)
+                continue
+            fresh = ~raster.is_covered(cells)
+            raster.cover(cells)
+            all_lons.append(lons[fresh])
+            all_lats.append(lats[fresh])
+            all_values.append(values[fresh])
+
+    if merge == 'mean' and raster is not None:
+        with span('stl.merge'):
+            return raster.mean()
+    if not all_lons:
+        return np.array([]), np.array([]), np.array([])
+    return np.concatenate(all_lons), np.concatenate(all_lats), np.concatenate(all_values)
+
+
+def build_mesh(lons, lats, values, max_triangles=None, tolerance=None):
+    """Triangulates the points into a closed (top surface, side walls and base) terrain mesh.
+
+    With max_triangles and/or tolerance (maximum vertical error in model millimetres) the top surface is
+    simplified first; the outline, and so the walls and base, is always kept.
+    The mesh is returned as an array of STL_RECORD_DTYPE records; normals are filled in when it is encoded.
+    """
+    if max_triangles is not None and max_triangles < 1:
+        raise InvalidRegionError(f"max_triangles must be positive, got {max_triangles}")
+    if tolerance is not None and not tolerance >= 0:
+        raise InvalidRegionError(f"tolerance must be zero or positive, got {tolerance}")
+
+    # Check if enough data points were loaded
+    if len(lons) < 4:
+        raise InsufficientDataError(f"Not enough data points ({len(lons)}) near the specified location to perform triangulation.")
+
+    # Normalize coordinates and values
+    x_normalized = (lons - np.min(lons)) / (np.max(lons) - np.min(lons)) * XY_SIZE
+    y_normalized = (lats - np.min(lats)) / (np.max(lats) - np.min(lats)) * XY_SIZE
+
+    if np.max(values) - np.min(values) == 0:
+        z_normalized = np.zeros_like(values)
+    else:
+        z_normalized = (values - np.min(values)) / (np.max(values) - np.min(values)) * Z_SIZE
+
+    # Prepare points for triangulation
+    points2D = np.vstack((x_normalized, y_normalized)).T
+
+    # Check for colinear points
+    if np.linalg.matrix_rank(points2D - points2D[0]) < 2:
+        raise DegenerateDataError("Data points are colinear. Cannot perform Delaunay triangulation.")
+
+    # Find the convex hull of the set of points to get the boundary edges
+    with span('stl.hull'):
+        hull = ConvexHull(points2D)
+    boundary_current = hull.vertices
+
+    # Reduce the surface to the points needed for the requested triangle budget or tolerance
+    max_vertices = None
+    if max_triangles is not None:
+        if max_triangles < simplify.min_triangles(len(boundary_current)):
+            raise InvalidRegionError(
+                f"max_triangles must be at least {simplify.min_triangles(len(boundary_current))} for this region"
+            )
+        max_vertices = simplify.vertex_budget(max_triangles, len(boundary_current))
+    if tolerance is not None or (max_vertices is not None and max_vertices < len(points2D)):
+        with span('stl.simplify'):
+            keep = simplify.simplify_surface(points2D, z_normalized, boundary_current, max_vertices=max_vertices, tolerance=tolerance)
+        points2D, x_normalized, y_normalized, z_normalized = points2D[keep], x_normalized[keep], y_normalized[keep], z_normalized[keep]
+        boundary_current = np.searchsorted(keep, boundary_current)
+
+    # Perform Delaunay triangulation
+    with span('stl.delaunay'):
+        tri = Delaunay(points2D)
+
+    # Terrain surface vertices and the same vertices dropped to z = 0
+    top = np.column_stack((x_normalized, y_normalized, z_normalized))
+    bottom = np.column_stack((x_normalized, y_normalized, np.zeros_like(z_normalized)))
+
+    # --- Add Side Walls and Base to Create Volume ---
+
+    boundary_next = np.roll(boundary_current, -1)
+
+    # Triangulate the boundary points projected onto z = 0 to fill the bottom
+    with span('stl.delaunay'):
+        base_tri = Delaunay(points2D[boundary_current])
+
+    # --- End of Volume Addition ---
+
+    # Write every face straight into a preallocated STL record array:
+    # top surface, then two triangles per side wall quad, then the base
+    num_top = len(tri.simplices)
+    num_walls = 2 * len(boundary_current)
+    num_base = len(base_tri.simplices)
+    with span('stl.faces'):
+        data = np.zeros(num_top + num_walls + num_base, dtype=STL_RECORD_DTYPE)
+        vectors = data['vectors']
+
+        vectors[:num_top] = top[tri.simplices]
+
+        walls = vectors[num_top:num_top + num_walls]
+        walls[0::2] = np.stack((top[boundary_current], bottom[boundary_current], bottom[boundary_next]), axis=1)
+        walls[1::2] = np.stack((top[boundary_current], bottom[boundary_next], top[boundary_next]), axis=1)
+
+        vectors[num_top + num_walls:] = bottom[boundary_current[base_tri.simplices]]
+
+    return data
+
+
+def load_grid_index(grid_path):
+    """Returns the spatial index of a grid file's valid cells; its values are the flat cell indices."""
+    def load():
+        grid = pointstore.load_grid(grid_path)
+        cells = np.flatnonzero(~np.isnan(grid[pointstore.VALUE]).ravel())
+        return grid[pointstore.LON].ravel()[cells], grid[pointstore.LAT].ravel()[cells], cells
+    return spatial.get_index(grid_path, load)
+
+
+def load_grid_window(csv_file, lng, lat, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS, max_points=DEFAULT_MAX_POINTS):
+    """Reads the window of a granule's grid that covers the region around (lng, lat).
+
+    Returns a (3, rows, cols) lon/lat/value array with NaN values outside the region, or None if the region
+    misses the granule. Windows with more than max_points cells are read with a row/column stride.
+    """
+    grid_path = pointstore.grid_path_for(csv_file)
+    if not os.path.exists(grid_path):
+        raise DataFormatError(f"No grid file for {os.path.basename(csv_file)}; re-run the ingest to mesh it in grid mode")
+
+    index = load_grid_index(grid_path)
+    cells = index.values[index.query(lng, lat, radius, shape=shape, units=units)]
+    if cells.size == 0:
+        return None
+
+    grid = pointstore.load_grid(grid_path)
+    rows, cols = np.divmod(cells, grid.shape[2])
+    step = 1
+    if max_points is not None and len(cells) > max_points:
+        step = math.ceil(math.sqrt(len(cells) / max_points))
+
+    window = np.array(grid[:, rows.min():rows.max() + 1:step, cols.min():cols.max() + 1:step])
+    inside = spatial.region_mask(window[pointstore.LON], window[pointstore.LAT], lng, lat, radius, shape=shape, units=units)
+    window[pointstore.VALUE][~inside] = np.nan
+    return window
+
+
+def build_grid_mesh(windows):
+    """Meshes grid windows into one closed terrain mesh: two triangles per cell whose four corners have data,
+    side walls along every outer and hole edge, and a base mirroring the top surface.
+
+    All windows are normalized together, like the points of several granules in build_mesh.
+    """
+    cell_masks = []
+    for window in windows:
+        valid = ~np.isnan(window[pointstore.VALUE])
+        cell_masks.append(valid[:-1, :-1] & valid[:-1, 1:] & valid[1:, :-1] & valid[1:, 1:])
+    if not any(mask.any() for mask in cell_masks):
+        raise InsufficientDataError("Not enough data near the specified location to build a grid mesh.")
+
+    # Normalize with the extent of every vertex used by a cell
+    used = []
+    for window, cells in zip(windows, cell_masks):
+        corners = np.zeros(window.shape[1:], dtype=bool)
+        corners[:-1, :-1] |= cells
+        corners[:-1, 1:] |= cells
+        corners[1:, :-1] |= cells
+        corners[1:, 1:] |= cells
+        used.append(window[:, corners])
+    used = np.concatenate(used, axis=1)
+    low, high = used.min(axis=1), used.max(axis=1)
+    extent = high - low
+    if extent[pointstore.LON] == 0 or extent[pointstore.LAT] == 0:
+        raise DegenerateDataError("Grid cells are colinear. Cannot build a terrain mesh.")
+    scale = np.array([XY_SIZE, XY_SIZE, Z_SIZE]) / np.where(extent == 0, 1, extent)
+
+    meshes = []
+    for window, cells in zip(windows, cell_masks):
+        top = (np.moveaxis(window, 0, -1) - low) * scale
+        bottom = top.copy()
+        bottom[..., 2] = 0
+
+        # Corners of every cell; walk each cell counter-clockwise so the top surface faces up
+        r, c = np.nonzero(cells)
+        a, b, d = (r, c), (r, c + 1), (r + 1, c)
+        diagonal = (r + 1, c + 1)
+        padded = np.pad(cells, 1)
+        neighbours = [padded[r, c + 1], padded[r + 1, c + 2], padded[r + 2, c + 1], padded[r + 1, c]]  # Above, right, below, left
+        ab, ad = top[b] - top[a], top[d] - top[a]
+        if np.median(ab[:, 0] * ad[:, 1] - ab[:, 1] * ad[:, 0]) < 0:
+            b, d = d, b
+            neighbours = neighbours[::-1]  # Left, below, right, above
+        corners = [a, b, diagonal, d]
+
+        top_faces = np.concatenate((
+            np.stack((top[a], top[b], top[diagonal]), axis=1),
+            np.stack((top[a], top[diagonal], top[d]), axis=1),
+        ))
+        base_faces = np.concatenate((
+            np.stack((bottom[a], bottom[diagonal], bottom[b]), axis=1),
+            np.stack((bottom[a], bottom[d], bottom[diagonal]), axis=1),
+        ))
+
+        # A cell edge is on the outline when the cell across it has no data
+        walls = []
+        for side in range(4):
+            edge = ~neighbours[side]
+            p = tuple(index[edge] for index in corners[side])
+            q = tuple(index[edge] for index in corners[(side + 1) % 4])
+            walls.append(np.stack((top[p], bottom[p], bottom[q]), axis=1))
+            walls.append(np.stack((top[p], bottom[q], top[q]), axis=1))
+
+        meshes.append((top_faces, np.concatenate(walls), base_faces))
+
+    # Same record order as build_mesh: top surface, walls, base
+    vectors = np.concatenate([mesh[part] for part in range(3) for mesh in meshes])
+    data = np.zeros(len(vectors), dtype=STL_RECORD_DTYPE)
+    data['vectors'] = vectors
+    return data
+
+
+def report_progress(progress, stage, fraction):
+    if progress is not None:
+        progress(stage, fraction)
+
+
+def generate_grid_mesh(csv_files, lng, lat, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS, max_points=DEFAULT_MAX_POINTS,
+                       progress=None):
+    """Builds the terrain mesh straight from the grid windows of the granules around (lng, lat)."""
+    try:
+        spatial.validate_region(radius, shape, units)
+    except spatial.RegionError as e:
+        raise InvalidRegionError(str(e))
+    if max_points is not None and max_points < 4:
+        raise InvalidRegionError(f"max_points must be at least 4, got {max_points}")
+
+    windows = []
+    for number, csv_file in enumerate(csv_files):
+        report_progress(progress, 'loading', 0.5 * number / len(csv_files))
+        with span('stl.load'):
+            window = load_grid_window(csv_file, lng, lat, radius=radius, shape=shape, units=units, max_points=max_points)
+        if window is not None:
+            windows.append(window)
+    if not windows:
+        raise InsufficientDataError("No grid cells near the specified location.")
+    report_progress(progress, 'meshing', 0.5)
+    with span('stl.faces'):
+        return build_grid_mesh(windows)
+
+
+def compute_normals(vectors):
+    """Returns the (unnormalized, like numpy-stl) face normals of an (N, 3, 3) vertex array."""
+    return np.cross(vectors[:, 1] - vectors[:, 0], vectors[:, 2] - vectors[:, 0])
+
+
+def mesh_chunk(terrain_mesh, start, stop):
+    """Returns records [start, stop) of a mesh with their normals filled in.
+
+    Read-only meshes (e.g. cached ones shared between requests) are copied chunk by chunk instead of modified.
+    """
+    chunk = terrain_mesh[start:stop]
+    if not chunk.flags.writeable:
+        chunk = chunk.copy()
+    chunk['normals'] = compute_normals(chunk['vectors'])
+    return chunk
+
+
+def stl_header(name):
+    """Returns an 80-byte binary STL header containing the name."""
+    header = name.encode('ascii', 'replace') if isinstance(name, str) else bytes(name)
+    return header[:STL_HEADER_SIZE].ljust(STL_HEADER_SIZE, b' ')
+
+
+def binary_stl_size(num_triangles):
+    """Returns the size in bytes of a binary STL with the given number of triangles."""
+    return STL_HEADER_SIZE + 4 + STL_RECORD_DTYPE.itemsize * num_triangles
+
+
+def iter_binary_stl(terrain_mesh, name='terrain.stl', header=None, chunk_triangles=STL_CHUNK_TRIANGLES):
+    """Yields a mesh as binary STL, chunk by chunk, computing the normals of each chunk as it goes."""
+    yield (header if header is not None else stl_header(name)) + np.uint32(len(terrain_mesh)).astype('<u4').tobytes()
+    for start in range(0, len(terrain_mesh), chunk_triangles):
+        chunk = mesh_chunk(terrain_mesh, start, start + chunk_triangles)
+        yield chunk.tobytes()
+
+
+def iter_ascii_stl(terrain_mesh, name='terrain.stl', chunk_triangles=STL_CHUNK_TRIANGLES):
+    """Yields a mesh as ASCII STL, chunk by chunk (9 significant digits, as numpy-stl writes it)."""
+    facet = (
+        'facet normal %.9g %.9g %.9g\n'
+        '  outer loop\n'
+        '    vertex %.9g %.9g %.9g\n'
+        '    vertex %.9g %.9g %.9g\n'
+        '    vertex %.9g %.9g %.9g\n'
+        '  endloop\n'
+        'endfacet\n'
+    )
+    yield f'solid {name}\n'.encode('ascii', 'replace')
+    for start in range(0, len(terrain_mesh), chunk_triangles):
+        chunk = mesh_chunk(terrain_mesh, start, start + chunk_triangles)
+        rows = np.hstack((chunk['normals'], chunk['vectors'].reshape(-1, 9))).tolist()
+        yield ''.join([facet % tuple(row) for row in rows]).encode('ascii')
+    yield f'endsolid {name}\n'.encode('ascii', 'replace')
+
+
+def iter_stl(terrain_mesh, name='terrain.stl', ascii=False, compress=False, chunk_triangles=STL_CHUNK_TRIANGLES):
+    """Yields a mesh as binary (default) or ASCII STL, optionally gzip-compressed.
+
+    The time spent encoding (not waiting for the consumer) is recorded as the 'stl.encode' stage.
+    """
+    return timed_iter('stl.encode', encode_stl(terrain_mesh, name=name, ascii=ascii, compress=compress, chunk_triangles=chunk_triangles))
+
+
+def encode_stl(terrain_mesh, name='terrain.stl', ascii=False, compress=False, chunk_triangles=STL_CHUNK_TRIANGLES):
+    if ascii:
+        chunks = iter_ascii_stl(terrain_mesh, name=name, chunk_triangles=chunk_triangles)
+    else:
+        chunks = iter_binary_stl(terrain_mesh, name=name, chunk_triangles=chunk_triangles)
+    if not compress:
+        yield from chunks
+        return
+
+    # wbits=31 makes zlib emit a complete gzip stream (header and trailer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def write_mesh(terrain_mesh, fh, name='terrain.stl', ascii=False, compress=False):
+    """Writes a mesh as STL to an open binary file handle."""
+    for chunk in iter_stl(terrain_mesh, name=name, ascii=ascii, compress=compress):
+        fh.write(chunk)
+
+
+def mesh_to_bytes(terrain_mesh, name='terrain.stl', ascii=False, compress=False):
+    """Serializes a mesh to STL and returns the raw bytes."""
+    buffer = io.BytesIO()
+    write_mesh(terrain_mesh, buffer, name=name, ascii=ascii, compress=compress)
+    return buffer.getvalue()
+
+
+def validate_mesh_options(radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS, max_points=DEFAULT_MAX_POINTS,
+                          aggregate=pyramid.DEFAULT_AGGREGATE, max_triangles=None, tolerance=None, mode=DEFAULT_MESH_MODE,
+                          bbox=None, merge=DEFAULT_MERGE):
+    """Checks the generate_mesh options without reading any data and raises InvalidRegionError if they are
+    unusable, so requests can be turned away before any work is queued."""
+    if mode not in MESH_MODES:
+        raise InvalidRegionError(f"Unknown mode '{mode}'. Expected one of: {', '.join(MESH_MODES)}")
+    if mode == 'grid':
+        if max_triangles is not None or tolerance is not None or aggregate != pyramid.DEFAULT_AGGREGATE:
+            raise InvalidRegionError("max_triangles, tolerance and aggregate are only supported in 'delaunay' mode")
+        if bbox is not None:
+            raise InvalidRegionError("Bounding-box regions are only supported in 'delaunay' mode")
+    try:
+        if bbox is not None:
+            spatial.validate_bbox(bbox)
+        else:
+            spatial.validate_region(radius, shape, units)
+    except spatial.RegionError as e:
+        raise InvalidRegionError(str(e))
+    if merge not in MERGE_POLICIES:
+        raise InvalidRegionError(f"Unknown merge policy '{merge}'. Expected one of: {', '.join(MERGE_POLICIES)}")
+    validate_detail(max_points, aggregate)
+    if max_triangles is not None and max_triangles < 1:
+        raise InvalidRegionError(f"max_triangles must be positive, got {max_triangles}")
+    if tolerance is not None and not tolerance >= 0:
+        raise InvalidRegionError(f"tolerance must be zero or positive, got {tolerance}")
+
+
+def generate_mesh(csv_files, lng, lat, columns=SWOT_COLUMNS, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS,
+                  max_points=DEFAULT_MAX_POINTS, aggregate=pyramid.DEFAULT_AGGREGATE, max_triangles=None, tolerance=None,
+                  mode=DEFAULT_MESH_MODE, bbox=None, merge=DEFAULT_MERGE, progress=None):
+    """Builds the terrain mesh from the points inside the region around (lng, lat) across the CSV files.
+
+    The region is a circle or box (shape) of the given radius, or half-width, in degrees or metres (units).
+    If bbox ({'west', 'east', 'south', 'north'}) is given it is the region instead. Either way overlapping
+    granules are merged with the merge policy ('latest' or 'mean').
+    Large regions are read from a coarser pyramid level so that each granule contributes at most max_points,
+    and the surface is simplified to max_triangles and/or tolerance if given.
+    In 'grid' mode the mesh is built from the ingest grid instead of triangulating the points.
+    progress, if given, is called with (stage, fraction done) as the work moves from loading to meshing.
+    Raises a TerrainError subclass when the data cannot be turned into a mesh.
+    """
+    validate_mesh_options(
+        radius=radius, shape=shape, units=units, max_points=max_points, aggregate=aggregate,
+        max_triangles=max_triangles, tolerance=tolerance, mode=mode, bbox=bbox, merge=merge
+    )
+    if mode == 'grid':
+        return generate_grid_mesh(csv_files, lng, lat, radius=radius, shape=shape, units=units, max_points=max_points, progress=progress)
+
+    report_progress(progress, 'loading', 0.0)
+    if bbox is not None:
+        lons, lats, values = load_bbox_points(
+            csv_files, bbox, columns=columns, max_points=max_points, aggregate=aggregate, merge=merge, progress=progress
+        )
+    else:
+        lons, lats, values = load_points(
+            csv_files, lng, lat, columns=columns, radius=radius, shape=shape, units=units, max_points=max_points, aggregate=aggregate,
+            merge=merge, progress=progress
+        )
+    report_progress(progress, 'meshing', 0.5)
+    return build_mesh(lons, lats, values, max_triangles=max_triangles, tolerance=tolerance)
+
+
+def generate_stl(csv_files, lng, lat, columns=SWOT_COLUMNS, radius=DEFAULT_RADIUS, shape=DEFAULT_SHAPE, units=DEFAULT_UNITS,
+                 max_points=DEFAULT_MAX_POINTS, aggregate=pyramid.DEFAULT_AGGREGATE, max_triangles=None, tolerance=None,
+                 mode=DEFAULT_MESH_MODE, bbox=None, merge=DEFAULT_MERGE):
+    """Generates a binary STL from the points inside the region around (lng, lat), or inside bbox, and returns it as bytes."""
+    return mesh_to_bytes(generate_mesh(
+        csv_files, lng, lat, columns=columns, radius=radius, shape=shape, units=units, max_points=max_points, aggregate=aggregate,
+        max_triangles=max_triangles, tolerance=tolerance, mode=mode, bbox=bbox, merge=merge
+    ))
@@ -5,15 +5,16 @@ WEST=$1
 EAST=$2
 SOUTH=$3
 NORTH=$4
+MERGE=${5:-latest}  # How overlapping granules are merged: latest or mean
 
 if [ -z "$WEST" ] || [ -z "$EAST" ] || [ -z "$SOUTH" ] || [ -z "$NORTH" ]; then
-  echo "Usage: ./generate_stl.sh <west> <east> <south> <north>"
+  echo "Usage: ./generate_stl.sh <west> <east> <south> <north> [latest|mean]"
   exit 1
 fi
 
 curl -X POST "http://localhost:5001/swot/generate_stl" \
   -H "Content-Type: application/json" \
-  -d '{"west": '"$WEST"', "east": '"$EAST"', "south": '"$SOUTH"', "north": '"$NORTH"'}' \
+  -d '{"west": '"$WEST"', "east": '"$EAST"', "south": '"$SOUTH"', "north": '"$NORTH"', "merge": "'"$MERGE"'"}' \
   --output generated_terrain.stl
 
 if [ $? -eq 0 ]; then
@@ -0,0 +1,21 @@
+#!/bin/bash
+#example ./get_json_viewport.sh -80.1,42.5,-78.9,43.2 8 20
+#example ./get_json_viewport.sh -80.1,42.5,-78.9,43.2 8 20 <cursor from the X-Next-Cursor header>
+# get_json_viewport.sh
+BBOX=$1  # west,south,east,north
+ZOOM=$2
+LIMIT=${3:-100}  # Locations per page
+CURSOR=$4  # Optional: X-Next-Cursor of the previous page
+
+if [ -z "$BBOX" ] || [ -z "$ZOOM" ]; then
+  echo "Usage: ./get_json_viewport.sh <west,south,east,north> <zoom> [limit] [cursor]"
+  exit 1
+fi
+
+URL="http://localhost:5001/swot/get_json?bbox=$BBOX&zoom=$ZOOM&limit=$LIMIT"
+if [ -n "$CURSOR" ]; then
+  URL="$URL&cursor=$CURSOR"
+fi
+
+# -i prints the X-Next-Cursor header of the next page, if there is one
+curl -i -X GET "$URL" -H "Content-Type: application/json"
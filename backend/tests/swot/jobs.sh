@@ -0,0 +1,38 @@
+#!/bin/bash
+#example ./jobs.sh -79.19 42.65 0.05
+# jobs.sh
+# Queues an STL job, polls it until it has finished and downloads its mesh
+# (needs WEB_WORKERS=1 or sticky routing, see wsgi.py)
+LNG=$1
+LAT=$2
+RADIUS=${3:-0.1}  # Degrees around the point
+
+if [ -z "$LNG" ] || [ -z "$LAT" ]; then
+  echo "Usage: ./jobs.sh <lng> <lat> [radius]"
+  exit 1
+fi
+
+RESPONSE=$(curl -s -X POST "http://localhost:5001/swot/generate_stl/jobs" \
+  -H "Content-Type: application/json" \
+  -d '{"lng": '"$LNG"', "lat": '"$LAT"', "radius": '"$RADIUS"'}')
+echo "$RESPONSE"
+
+STATUS_URL=$(echo "$RESPONSE" | sed -n 's/.*"status_url": *"\([^"]*\)".*/\1/p')
+if [ -z "$STATUS_URL" ]; then
+  echo "Failed to queue STL job"
+  exit 1
+fi
+
+STATE=queued
+while [ "$STATE" = "queued" ] || [ "$STATE" = "running" ]; do
+  sleep 1
+  STATUS=$(curl -s -X GET "http://localhost:5001$STATUS_URL")
+  STATE=$(echo "$STATUS" | sed -n 's/.*"state": *"\([^"]*\)".*/\1/p')
+  echo "$STATUS"
+done
+
+if [ "$STATE" = "done" ] && curl -f -X GET "http://localhost:5001$STATUS_URL/result" --output generated_terrain.stl; then
+  echo "STL file has been generated and saved as generated_terrain.stl"
+else
+  echo "Failed to generate STL file ($STATE)"
+fi
@@ -0,0 +1,3 @@
+#!/bin/bash
+# metrics.sh
+curl -X GET http://localhost:5001/metrics
@@ -0,0 +1,31 @@
+#!/bin/bash
+#example ./tiles.sh 10 286 377
+#example ./tiles.sh 10 286 377 hide <granule name>,<granule name>
+# tiles.sh
+Z=$1
+X=$2
+Y=$3
+MODE=$4  # Optional: show (only these granules) or hide (every granule but these)
+NAMES=$5  # Comma-separated granule names, as listed by get_json
+
+if [ -z "$Z" ] || [ -z "$X" ] || [ -z "$Y" ]; then
+  echo "Usage: ./tiles.sh <z> <x> <y> [show|hide <names>]"
+  exit 1
+fi
+
+URL="http://localhost:5001/swot/tiles/$Z/$X/$Y.png"
+if [ -n "$MODE" ]; then
+  if [ "$MODE" != "show" ] && [ "$MODE" != "hide" ]; then
+    echo "Usage: ./tiles.sh <z> <x> <y> [show|hide <names>]"
+    exit 1
+  fi
+  URL="$URL?$MODE=$NAMES"
+fi
+
+curl -X GET "$URL" --output tile.png
+
+if [ $? -eq 0 ]; then
+  echo "Tile has been saved as tile.png"
+else
+  echo "Failed to get tile"
+fi
@@ -0,0 +1,13 @@
+#!/bin/bash
+#example ./timeseries.sh -79.19 42.65 0.05
+# timeseries.sh
+LNG=$1
+LAT=$2
+RADIUS=${3:-0.1}  # Degrees around the point
+
+if [ -z "$LNG" ] || [ -z "$LAT" ]; then
+  echo "Usage: ./timeseries.sh <lng> <lat> [radius]"
+  exit 1
+fi
+
+curl -X GET "http://localhost:5001/swot/timeseries?lng=$LNG&lat=$LAT&radius=$RADIUS" -H "Content-Type: application/json"
@@ -0,0 +1,177 @@
+import io
+import math
+import os
+import numpy as np
+from PIL import Image
+from lrucache import LRUCache
+from spatial import FootprintIndex
+
+TILE_SIZE = 256
+MAX_ZOOM = 22
+
+# Web Mercator is undefined at the poles; tiles stop at this latitude
+MAX_LATITUDE = 85.0511287798066
+
+
+def is_valid_tile(z, x, y):
+    """Returns True if z/x/y addresses an existing tile of the XYZ (slippy map) scheme."""
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def mercator_y(lat):
+    """Returns the Web Mercator y of a latitude (radians of northing, increasing to the north)."""
+    lat = np.radians(np.clip(lat, -MAX_LATITUDE, MAX_LATITUDE))
+    return np.log(np.tan(np.pi / 4 + lat / 2))
+
+
+def tile_bounds(z, x, y):
+    """Returns the {'west', 'east', 'south', 'north'} bounding box of a tile in degrees."""
+    n = 2 ** z
+
+    def latitude(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return {
+        'west': x / n * 360.0 - 180.0,
+        'east': (x + 1) / n * 360.0 - 180.0,
+        'south': latitude(y + 1),
+        'north': latitude(y),
+    }
+
+
+def tile_pixel_centres(z, x, y):
+    """Returns the longitudes of the tile's pixel columns and the mercator y of its pixel rows."""
+    n = 2 ** z
+    offsets = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+    lons = (x + offsets) / n * 360.0 - 180.0
+    merc_ys = np.pi * (1 - 2 * (y + offsets) / n)
+    return lons, merc_ys
+
+
+def encode_png(rgba):
+    buffer = io.BytesIO()
+    Image.fromarray(rgba, 'RGBA').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+class TileRenderer:
+    """Cuts 256 px XYZ tiles out of a dataset's granule PNGs.
+
+    Each granule image is stretched over its bounding box the same way Leaflet's ImageOverlay
+    draws it (linear in longitude and in mercator y), so tiles line up with the old overlays.
+    Decoded granule images and encoded tiles are kept in separate byte-bounded LRU caches.
+    Granules with an overview pyramid ('levels' in locations.json) are read from the coarsest
+    level that still has at least one image pixel per tile pixel.
+    """
+
+    def __init__(self, directory, locations, image_cache_bytes, tile_cache_bytes):
+        self.directory = directory
+        self.images = LRUCache(image_cache_bytes)
+        self.tiles = LRUCache(tile_cache_bytes)
+        self._image_widths = {}
+        self.set_locations(locations)
+
+    def set_locations(self, locations):
+        """Replaces the granules tiles are cut from. Cached images and tiles stay valid, as their keys name the files used."""
+        self.index = FootprintIndex([location for location in locations if location.get('image')])
+
+    def stats(self):
+        return {'images': self.images.stats(), 'tiles': self.tiles.stats()}
+
+    def _load_image(self, path, mtime_ns):
+        # Greyscale and RGBA images are kept as decoded; anything else (e.g. palette) becomes RGBA
+        def decode():
+            with Image.open(path) as image:
+                if image.mode not in ('L', 'RGBA'):
+                    image = image.convert('RGBA')
+                return np.asarray(image)
+        return self.images.get_or_create((path, mtime_ns), decode)
+
+    def _image_width(self, path, mtime_ns):
+        # Only the PNG header is read
+        key = (path, mtime_ns)
+        if key not in self._image_widths:
+            with Image.open(path) as image:
+                self._image_widths[key] = image.width
+        return self._image_widths[key]
+
+    def _level_image(self, location, z):
+        # Full-resolution image, or the coarsest pyramid level that is still at least as sharp as the tile
+        path = os.path.join(self.directory, location['image'])
+        levels = location.get('levels')
+        if not levels:
+            return path
+
+        tile_pixel_degrees = 360.0 / (2 ** z * TILE_SIZE)
+        granule_degrees = location['bounding_box']['northeast']['lng'] - location['bounding_box']['southwest']['lng']
+        try:
+            image_pixel_degrees = granule_degrees / self._image_width(path, os.stat(path).st_mtime_ns)
+        except OSError:
+            return path
+        for level in sorted(levels, key=lambda level: level['factor'], reverse=True):
+            if level.get('image') and image_pixel_degrees * level['factor'] <= tile_pixel_degrees:
+                return os.path.join(self.directory, level['image'])
+        return path
+
+    def _granules(self, z, bbox, hidden, shown):
+        # Visible granules overlapping the tile, with the mtime of their image for cache keys
+        granules = []
+        for location in self.index.intersecting(bbox):
+            if location.get('name') in hidden or (shown is not None and location.get('name') not in shown):
+                continue
+            path = self._level_image(location, z)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            granules.append((location, path, mtime_ns))
+        return granules
+
+    def render(self, z, x, y, hidden=(), shown=None):
+        """Returns the PNG bytes of tile z/x/y, leaving out the granules named in hidden and, if shown is
+        given, every granule not named in it."""
+        granules = self._granules(z, tile_bounds(z, x, y), set(hidden), None if shown is None else set(shown))
+        if not granules:
+            return EMPTY_TILE
+
+        key = (z, x, y, tuple((path, mtime_ns) for _, path, mtime_ns in granules))
+        return self.tiles.get_or_create(key, lambda: self._render(z, x, y, granules))
+
+    def _render(self, z, x, y, granules):
+        lons, merc_ys = tile_pixel_centres(z, x, y)
+        tile = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+
+        # Later granules are drawn over earlier ones, like overlays added in locations order
+        for location, path, mtime_ns in granules:
+            image = self._load_image(path, mtime_ns)
+            height, width = image.shape[:2]
+            southwest, northeast = location['bounding_box']['southwest'], location['bounding_box']['northeast']
+
+            # Nearest-neighbour source column of every tile column and source row of every tile row
+            west, east = southwest['lng'], northeast['lng']
+            top, bottom = mercator_y(northeast['lat']), mercator_y(southwest['lat'])
+            if east <= west or top <= bottom:
+                continue
+            cols = np.floor((lons - west) / (east - west) * width).astype(np.int64)
+            rows = np.floor((top - merc_ys) / (top - bottom) * height).astype(np.int64)
+            tile_cols = np.flatnonzero((cols >= 0) & (cols < width))
+            tile_rows = np.flatnonzero((rows >= 0) & (rows < height))
+            if not len(tile_cols) or not len(tile_rows):
+                continue
+
+            pixels = image[np.ix_(rows[tile_rows], cols[tile_cols])]
+            if pixels.ndim == 2:
+                rgba = np.empty(pixels.shape + (4,), dtype=np.uint8)
+                rgba[..., :3] = pixels[..., np.newaxis]
+                rgba[..., 3] = 255
+                pixels = rgba
+
+            target = tile[np.ix_(tile_rows, tile_cols)]
+            opaque = pixels[..., 3] > 0
+            target[opaque] = pixels[opaque]
+            tile[np.ix_(tile_rows, tile_cols)] = target
+
+        return encode_png(tile)
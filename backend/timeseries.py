@@ -0,0 +1,205 @@
+import os
+import re
+import threading
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+import pointstore
+import spatial
+from catalog import granule_name, TIME_FORMAT
+from lrucache import LRUCache
+from meshcache import quantize, source_fingerprint
+from terrain import load_granule_data, InvalidRegionError
+from timing import span
+
+# Cycle, pass and tile of a SWOT granule name, e.g. '..._020_354_039F_20240902T064347_...'
+SWOT_PASS_PATTERN = re.compile(r'_(\d{3})_(\d{3})_(\d{3}[A-Z])_(\d{8}T\d{6})_')
+
+# Columns of each row of a time series
+SERIES_COLUMNS = ('time', 'cycle', 'pass', 'tiles', 'mean', 'median', 'count')
+
+# Below this many granules to read, a query is answered in the calling thread rather than in the pool
+POOL_MIN_GRANULES = 4
+
+# Pixel size in metres of a SWOT raster product, e.g. '..._Raster_100m_...'
+RESOLUTION_PATTERN = re.compile(r'_(\d+)m_')
+
+# A granule of the archive: its acquisition time (TIME_FORMAT), SWOT cycle, pass and tile, pixel size in metres
+# (each None if its name has none) and CSV path
+Granule = namedtuple('Granule', ['time', 'cycle', 'pass_number', 'tile', 'resolution', 'csv_path'])
+
+
+def parse_granule(location, csv_path):
+    """Returns the Granule of a locations.json entry, or None if its name carries no acquisition time."""
+    name = granule_name(location)
+    resolution = RESOLUTION_PATTERN.search(name)
+    resolution = int(resolution.group(1)) if resolution else None
+    match = SWOT_PASS_PATTERN.search(name)
+    if match:
+        cycle, pass_number, tile, time = match.groups()
+        return Granule(time, int(cycle), int(pass_number), tile, resolution, csv_path)
+    time = re.search(r'\d{8}T\d{6}', name)
+    return Granule(time.group(0), None, None, None, resolution, csv_path) if time else None
+
+
+class TimeSeriesIndex:
+    """Temporal-spatial index over a layer's granules: their footprints, each keyed by the acquisition time
+    (and SWOT cycle/pass) in its name.
+
+    Only granules with point data and a time in their name are indexed.
+    """
+
+    def __init__(self, locations, csv_paths):
+        # When a tile of a pass was ingested in several products (e.g. the 100 m and 250 m rasters), only the
+        # finest is indexed, so a pass counts each water pixel once
+        finest = {}
+        for location in locations:
+            csv_path = csv_paths.get(os.path.normpath(location['csv'])) if location.get('csv') else None
+            if csv_path is None or not (os.path.exists(csv_path) or os.path.exists(pointstore.points_path_for(csv_path))):
+                continue
+            granule = parse_granule(location, csv_path)
+            if granule is None:
+                continue
+            key = (granule.cycle, granule.pass_number, granule.tile) if granule.cycle is not None else csv_path
+            kept = finest.get(key)
+            if kept is None or (granule.resolution or 0) < (kept[0].resolution or 0):
+                finest[key] = (granule, location)
+
+        self.granules = {id(location): granule for granule, location in finest.values()}
+        self.footprints = spatial.FootprintIndex(location for _, location in finest.values())
+
+    def __len__(self):
+        return len(self.footprints)
+
+    def find(self, lng, lat, radius, units='degrees', start=None, end=None):
+        """Returns the granules whose footprint meets the region around (lng, lat), in time order, optionally
+        only those acquired between start and end (TIME_FORMAT strings, inclusive)."""
+        half_lng, half_lat = spatial.region_extent(lat, radius, units)
+        bbox = {'west': lng - half_lng, 'east': lng + half_lng, 'south': lat - half_lat, 'north': lat + half_lat}
+        granules = sorted(
+            (self.granules[id(location)] for location in self.footprints.intersecting(bbox)),
+            key=lambda granule: (granule.time, granule.csv_path),
+        )
+        return [
+            granule for granule in granules
+            if (start is None or granule.time >= start) and (end is None or granule.time <= end)
+        ]
+
+
+def select_values(csv_paths, columns, lng, lat, radius, shape, units):
+    """Returns the full-resolution values inside the region around (lng, lat) of each granule (run in the pool)."""
+    return [
+        load_granule_data(csv_path, lng, lat, columns=columns, radius=radius, shape=shape, units=units, max_points=None)[2]
+        for csv_path in csv_paths
+    ]
+
+
+def aggregate(groups, values, num_groups):
+    """Returns the mean, median and count of the values in each group (0 .. num_groups - 1), computed for all
+    groups at once; groups without values get NaN statistics."""
+    counts = np.bincount(groups, minlength=num_groups)
+    sums = np.bincount(groups, weights=values, minlength=num_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = sums / counts
+
+    # Sort by group, then value: each group's values are then a sorted run starting at its offset
+    ordered = values[np.lexsort((values, groups))]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has_values = counts > 0
+    medians = np.full(num_groups, np.nan)
+    lower = starts[has_values] + (counts[has_values] - 1) // 2
+    upper = starts[has_values] + counts[has_values] // 2
+    medians[has_values] = (ordered[lower] + ordered[upper]) / 2
+    return means, medians, counts
+
+
+def iso_time(time):
+    return datetime.strptime(time, TIME_FORMAT).isoformat() + 'Z'
+
+
+class TimeSeriesExtractor:
+    """Builds water-surface time series: the values of every granule around a point, aggregated per pass.
+
+    Each granule's values in a region are kept in a cache (keyed by the granule's point file and the snapped
+    region), so repeating a query, or extending it with a new pass, only reads granules it has not seen.
+    Uncached granules are read in a pool of worker processes, started on first use.
+    """
+
+    def __init__(self, max_workers, cache_max_bytes):
+        self.max_workers = max_workers
+        self.cache = LRUCache(cache_max_bytes)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _read(self, csv_paths, columns, lng, lat, region):
+        if self.max_workers <= 1 or len(csv_paths) < POOL_MIN_GRANULES:
+            return select_values(csv_paths, columns, lng, lat, **region)
+        chunks = [csv_paths[i::self.max_workers] for i in range(self.max_workers)]
+        futures = [self._pool().submit(select_values, chunk, columns, lng, lat, **region) for chunk in chunks if chunk]
+        results = [future.result() for future in futures]
+        # Undo the round-robin split
+        values = [None] * len(csv_paths)
+        for i, chunk_values in enumerate(results):
+            values[i::self.max_workers] = chunk_values
+        return values
+
+    def values(self, granules, columns, lng, lat, region):
+        """Returns the values inside the region of each granule, from the cache where possible."""
+        keys = []
+        for granule in granules:
+            points_path = pointstore.points_path_for(granule.csv_path)
+            source = points_path if os.path.exists(points_path) else granule.csv_path
+            keys.append((tuple(source_fingerprint(source) or (source,)), lng, lat, tuple(sorted(region.items()))))
+
+        values = [self.cache.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            with span('timeseries.read'):
+                read = self._read([granules[i].csv_path for i in missing], columns, lng, lat, region)
+            for i, granule_values in zip(missing, read):
+                values[i] = self.cache.put(keys[i], np.ascontiguousarray(granule_values, dtype=np.float64))
+        return values
+
+    def series(self, index, columns, lng, lat, radius, shape='circle', units='degrees', start=None, end=None):
+        """Returns the time series around (lng, lat): one row (see SERIES_COLUMNS) per pass over the region,
+        oldest first. Tiles of the same pass are merged; passes whose tiles have no data there get a count of 0.
+
+        Raises InvalidRegionError if the region is unusable.
+        """
+        try:
+            spatial.validate_region(radius, shape, units)
+        except spatial.RegionError as e:
+            raise InvalidRegionError(str(e))
+        # Snap to the cache grid, like STL requests, so nearby repeat queries share cached values
+        lng, lat = quantize(lng), quantize(lat)
+        region = {'radius': radius, 'shape': shape, 'units': units}
+
+        granules = index.find(lng, lat, radius, units, start, end)
+        values = self.values(granules, columns, lng, lat, region)
+
+        # Granules of one pass share a cycle and pass number (or, without them, a time)
+        passes, groups, rows = {}, [], []
+        for granule in granules:
+            key = (granule.cycle, granule.pass_number) if granule.cycle is not None else granule.time
+            if key not in passes:
+                passes[key] = len(rows)
+                rows.append([iso_time(granule.time), granule.cycle, granule.pass_number, []])
+            rows[passes[key]][3].append(granule.tile)
+            groups.append(passes[key])
+
+        with span('timeseries.aggregate'):
+            all_groups = np.repeat(np.array(groups, dtype=np.intp), [len(granule_values) for granule_values in values])
+            all_values = np.concatenate(values) if values else np.array([])
+            means, medians, counts = aggregate(all_groups, all_values, len(rows))
+
+        return [
+            row + [None if np.isnan(mean) else float(mean), None if np.isnan(median) else float(median), int(count)]
+            for row, mean, median, count in zip(rows, means, medians, counts)
+        ]
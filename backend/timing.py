@@ -0,0 +1,222 @@
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from collections import OrderedDict
+
+# Upper bounds in seconds of the histogram buckets (an implicit +Inf bucket follows)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Content type of the Prometheus text exposition format
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+class Metric:
+    """A named family of samples, one series per combination of label values."""
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects the labels {', '.join(self.labelnames) or '(none)'}, got {', '.join(labels) or '(none)'}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            lines += self._samples(OrderedDict(zip(self.labelnames, key)), value)
+        return lines
+
+
+class Counter(Metric):
+    """A value that only goes up (e.g. a number of requests)."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def _samples(self, labels, value):
+        return [f'{self.name}{format_labels(labels)} {format_value(value)}']
+
+
+class Histogram(Metric):
+    """Counts of observations (e.g. durations in seconds) per bucket, with their sum and count."""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0}
+            series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+
+    def _samples(self, labels, value):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, value['counts']):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{format_labels(dict(labels, le=format_value(bound)))} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(value['sum'])}")
+        lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """The metrics of this process, rendered in the Prometheus text format.
+
+    Collectors are functions called at render time that return (name, type, help, [(labels, value), ...])
+    families, for values that are kept elsewhere (e.g. cache statistics).
+    """
+
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.render()
+        for collector in self._collectors:
+            for name, metric_type, help, samples in collector():
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} {metric_type}']
+                lines += [f'{name}{format_labels(labels)} {format_value(value)}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'stage_duration_seconds', 'Time spent in each stage of STL generation, ingest and image serving.', ('stage',)
+)
+
+# Spans recorded in this context (a request, an ingest run) are also appended here when it is being collected
+_collected = contextvars.ContextVar('collected_spans', default=None)
+
+
+def record(stage, seconds):
+    """Records that a stage took the given number of seconds."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    spans = _collected.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+
+def record_all(spans):
+    """Records spans timed elsewhere (e.g. in a worker process)."""
+    for stage, seconds in spans:
+        record(stage, seconds)
+
+
+@contextlib.contextmanager
+def span(stage):
+    """Times the block as one span of the given stage, e.g. with span('stl.delaunay'): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def timed_iter(stage, iterable):
+    """Yields from iterable and records the time spent producing its items as one span (e.g. streamed encoding)."""
+    elapsed = 0.0
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        record(stage, elapsed)
+
+
+def start_collecting():
+    """Starts collecting the spans recorded in the current context; returns (spans list, token for stop_collecting)."""
+    spans = []
+    return spans, _collected.set(spans)
+
+
+def stop_collecting(token):
+    _collected.reset(token)
+
+
+@contextlib.contextmanager
+def collect():
+    """Collects the spans recorded inside the block into the yielded list."""
+    spans, token = start_collecting()
+    try:
+        yield spans
+    finally:
+        stop_collecting(token)
+
+
+def summarize(spans):
+    """Returns {stage: (total seconds, number of spans)} in the order the stages first occurred."""
+    totals = OrderedDict()
+    for stage, seconds in spans:
+        total, count = totals.get(stage, (0.0, 0))
+        totals[stage] = (total + seconds, count + 1)
+    return totals
+
+
+def server_timing(spans, total=None):
+    """Returns a Server-Timing header value with the total milliseconds of each stage (and of the request)."""
+    entries = [f'{stage};dur={seconds * 1000:.2f}' for stage, (seconds, _) in summarize(spans).items()]
+    if total is not None:
+        entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
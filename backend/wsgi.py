@@ -0,0 +1,209 @@
+import argparse
+import gc
+import logging
+import os
+import time
+import pointstore
+import pyramid
+import terrain
+from terrain import TerrainError, InsufficientDataError
+
+logger = logging.getLogger(__name__)
+
+
+def env_flag(name, default):
+    return os.environ.get(name, '1' if default else '0').lower() in ('1', 'true', 'yes')
+
+
+# Production server settings, used by main() below and by gunicorn.conf.py
+WEB_BIND = os.environ.get('WEB_BIND', '0.0.0.0:5001')
+WEB_WORKERS = int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1))  # Processes (gunicorn only)
+WEB_THREADS = int(os.environ.get('WEB_THREADS', 4))  # Request threads per process
+WEB_TIMEOUT = int(os.environ.get('WEB_TIMEOUT', 120))  # Seconds a request may take (STLs of large regions are slow)
+WEB_GRACEFUL_TIMEOUT = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))  # Seconds workers get to finish requests on restart
+WEB_PRELOAD = env_flag('WEB_PRELOAD', True)  # Build every granule's spatial index before the workers are forked
+WEB_SELF_CHECK = env_flag('WEB_SELF_CHECK', True)  # Refuse to start if the data cannot be served
+WEB_STICKY_ROUTING = env_flag('WEB_STICKY_ROUTING', False)  # The proxy sends each client back to the same worker
+
+
+class SelfCheckError(RuntimeError):
+    """Raised when the startup self-check finds that the server cannot serve its data."""
+
+
+def granule_sources(layer):
+    """Yields the CSV path of every granule of a layer that has point data on disk."""
+    for csv_path in layer.state.csv_paths.values():
+        if os.path.exists(csv_path) or os.path.exists(pointstore.points_path_for(csv_path)):
+            yield csv_path
+
+
+def preload_layer(layer):
+    """Builds the spatial indexes STL requests use for every granule of a layer (full resolution, each pyramid
+    level and the grid) and returns how many were built.
+
+    Point files are memory-mapped, so their pages are shared between processes anyway; the KD-trees are
+    built in memory, so building them before forking lets every worker share them too.
+    """
+    count = 0
+    for csv_path in granule_sources(layer):
+        points_path = pointstore.points_path_for(csv_path)
+        grid_path = pointstore.grid_path_for(csv_path)
+        try:
+            terrain.load_granule_index(csv_path, columns=layer.dataset.columns)
+            count += 1
+            if pointstore.is_current(points_path, csv_path):
+                for factor in pyramid.find_levels(points_path)[1:]:
+                    terrain.load_granule_index(csv_path, columns=layer.dataset.columns, factor=factor)
+                    count += 1
+            if os.path.exists(grid_path):
+                terrain.load_grid_index(grid_path)
+                count += 1
+        except (OSError, TerrainError) as e:
+            logger.warning(f"Could not preload {os.path.basename(csv_path)} of {layer.name}: {e}")
+    return count
+
+
+def check_layer(app, layer):
+    """Returns (errors, warnings) about one layer: its locations, the files they name, and whether its
+    location list is served and a granule can be meshed."""
+    errors, warnings = [], []
+    state = layer.state
+    if not state.locations:
+        warnings.append(f"{layer.name}: no locations in {layer.dataset.location_file} (run python -m ingest {layer.name})")
+        return errors, warnings
+
+    missing_images = len(state.by_name) - len(state.image_paths)
+    if missing_images:
+        warnings.append(f"{layer.name}: {missing_images} of {len(state.by_name)} granule images are missing")
+    sources = list(granule_sources(layer))
+    if not sources:
+        warnings.append(f"{layer.name}: no granule has point data, so no STL can be generated")
+
+    response = app.test_client().get(f'/{layer.name}/get_json')
+    if response.status_code != 200:
+        errors.append(f"{layer.name}: GET /{layer.name}/get_json answered {response.status_code}")
+
+    # Mesh a small region in the middle of the first granule with data
+    for location in state.locations:
+        csv_path = state.csv_paths.get(os.path.normpath(location['csv'])) if location.get('csv') else None
+        if csv_path not in sources:
+            continue
+        southwest, northeast = location['bounding_box']['southwest'], location['bounding_box']['northeast']
+        lng, lat = (southwest['lng'] + northeast['lng']) / 2, (southwest['lat'] + northeast['lat']) / 2
+        try:
+            terrain.generate_mesh([csv_path], lng, lat, columns=layer.dataset.columns, radius=0.01)
+        except InsufficientDataError:
+            pass  # The middle of a granule may well be dry
+        except Exception as e:
+            errors.append(f"{layer.name}: meshing {os.path.basename(csv_path)} failed: {e!r}")
+        break
+    return errors, warnings
+
+
+def self_check(app, layers, workers=1, sticky_routing=WEB_STICKY_ROUTING):
+    """Checks every layer and returns (errors, warnings). Errors mean the server cannot work at all."""
+    errors, warnings = [], []
+    for layer in layers.values():
+        layer_errors, layer_warnings = check_layer(app, layer)
+        errors += layer_errors
+        warnings += layer_warnings
+    if not any(layer.state.locations for layer in layers.values()):
+        errors.append("No layer has any locations; ingest a dataset first (python -m ingest <dataset>)")
+    if workers > 1 and not sticky_routing:
+        warnings.append(
+            f"STL jobs are kept by the worker that queued them, so with {workers} workers /generate_stl/jobs "
+            "is turned off (set WEB_STICKY_ROUTING=1 behind a sticky proxy, or WEB_WORKERS=1, to keep it)"
+        )
+    return errors, warnings
+
+
+def create_app(workers=WEB_WORKERS, preload_data=WEB_PRELOAD, check=WEB_SELF_CHECK, sticky_routing=WEB_STICKY_ROUTING):
+    """Returns the Flask app ready to be forked into workers: locations loaded, spatial indexes built and
+    (with check) the startup self-check passed.
+
+    STL jobs live in the worker that queued them, so with several workers the /generate_stl/jobs routes
+    answer 404 unless sticky_routing says each client always reaches the same worker.
+
+    The in-memory cache budgets (INDEX_CACHE_MAX_BYTES, STL_CACHE_MAX_BYTES, TILE_IMAGE_CACHE_MAX_BYTES,
+    TILE_CACHE_MAX_BYTES, TIMESERIES_CACHE_MAX_BYTES) are totals for the whole server, so each of the workers
+    gets its share.
+    Raises SelfCheckError if the data cannot be served.
+    """
+    start = time.perf_counter()
+    import server  # Loads every layer's locations, footprint index and catalog
+
+    server.stl_jobs_enabled = workers <= 1 or sticky_routing
+
+    for cache in (server.index_cache, server.timeseries.cache):
+        cache.resize(cache.max_bytes // max(1, workers))
+    for layer in server.layers.values():
+        for cache in (layer.mesh_cache, layer.tiles.images, layer.tiles.tiles):
+            cache.resize(cache.max_bytes // max(1, workers))
+        if preload_data:
+            logger.info(f"Preloaded {preload_layer(layer)} spatial indexes of {layer.name}")
+    if preload_data and server.index_cache.stats()['evictions']:
+        logger.warning("Not every spatial index fits INDEX_CACHE_MAX_BYTES; the rest are built on first use")
+
+    if check:
+        errors, warnings = self_check(server.app, server.layers, workers, sticky_routing)
+        for warning in warnings:
+            logger.warning(f"Self-check: {warning}")
+        if errors:
+            for error in errors:
+                logger.error(f"Self-check: {error}")
+            raise SelfCheckError(f"Startup self-check failed: {'; '.join(errors)}")
+
+    # Keep the garbage collector away from everything loaded so far: collections in the workers would
+    # otherwise write to (and so copy) the pages they share with the master
+    gc.collect()
+    gc.freeze()
+    logger.info(f"App ready in {time.perf_counter() - start:.1f}s")
+    return server.app
+
+
+def run_gunicorn(bind, workers, threads, timeout, preload_data, check):
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('timeout', timeout)
+            self.cfg.set('graceful_timeout', WEB_GRACEFUL_TIMEOUT)
+            self.cfg.set('preload_app', True)  # create_app runs once, in the master, before forking
+
+        def load(self):
+            return create_app(workers, preload_data, check)
+
+    Application().run()
+
+
+def run_waitress(bind, threads, timeout, preload_data, check):
+    import waitress
+    waitress.serve(create_app(1, preload_data, check), listen=bind, threads=threads, channel_timeout=timeout)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the server for production (gunicorn on Unix, waitress elsewhere)')
+    parser.add_argument('--server', choices=('gunicorn', 'waitress'), help='WSGI server (default: gunicorn if installed, else waitress)')
+    parser.add_argument('--bind', default=WEB_BIND, help='host:port to listen on')
+    parser.add_argument('--workers', type=int, default=WEB_WORKERS, help='Worker processes (gunicorn only)')
+    parser.add_argument('--threads', type=int, default=WEB_THREADS, help='Request threads per process')
+    parser.add_argument('--timeout', type=int, default=WEB_TIMEOUT, help='Seconds a request may take')
+    parser.add_argument('--no-preload', dest='preload', action='store_false', default=WEB_PRELOAD, help='Build spatial indexes on first use')
+    parser.add_argument('--no-self-check', dest='check', action='store_false', default=WEB_SELF_CHECK, help='Skip the startup self-check')
+
+    args = parser.parse_args()
+    server_name = args.server
+    if server_name is None:
+        try:
+            import gunicorn  # noqa: F401
+            server_name = 'gunicorn'
+        except ImportError:
+            server_name = 'waitress'
+    if server_name == 'gunicorn':
+        run_gunicorn(args.bind, args.workers, args.threads, args.timeout, args.preload, args.check)
+    else:
+        run_waitress(args.bind, args.threads, args.timeout, args.preload, args.check)
@@ -1,83 +1,133 @@
-import React, { useState, useEffect } from "react";
-import { MapContainer, TileLayer, ImageOverlay } from "react-leaflet";
+import React, { useState, useCallback, useEffect, useRef } from "react";
+import { MapContainer, TileLayer } from "react-leaflet";
 import "leaflet/dist/leaflet.css"; // Leaflet CSS
 import "leaflet-draw/dist/leaflet.draw.css"; // Leaflet Draw CSS
 import DrawControl from "./DrawControl"; // Your DrawControl component
+import ViewportWatcher from "./ViewportWatcher";
 
 const BASE_URL = "http://159.203.60.247:5001";
 
+// Granules requested per get_json page
+const LOCATION_PAGE_SIZE = 500;
+
+// Milliseconds the map must stay still before the granules in view are fetched
+const VIEWPORT_DEBOUNCE_MS = 250;
+
+// Datasets whose granules are listed on the map
+const LOCATION_LAYERS = ["elevation", "swot"];
+
 function App() {
   const [elevationData, setElevationData] = useState([]);
   const [swotData, setSwotData] = useState([]);
   const [overlayVisible, setOverlayVisible] = useState({});
-  const [images, setImages] = useState({});
   const [selectAllElevation, setSelectAllElevation] = useState(true);
   const [selectAllSwot, setSelectAllSwot] = useState(true);
   const [isCollapsed, setIsCollapsed] = useState(true);
+  const [fetchErrors, setFetchErrors] = useState({});
+  // In-flight get_json fetches per dataset, and the pending debounced viewport change
+  const controllers = useRef({});
+  const viewportTimer = useRef(null);
 
-  useEffect(() => {
-    // Fetch elevation data
-    fetch(`${BASE_URL}/elevation/get_json`)
-      .then((response) => response.json())
-      .then((data) => {
-        setElevationData(data);
-        const visibility = {};
-        data.forEach((item) => {
-          if (item.name) {
-            visibility[item.name] = true;
-            fetchImage("elevation", item.name);
-          }
-        });
-        setOverlayVisible((prev) => ({ ...prev, ...visibility }));
-      })
-      .catch((error) => {
-        console.error("Error fetching elevation data:", error);
-        alert("Error fetching elevation data: " + error.message);
+  // Granules seen so far are kept (merged by name), so toggles survive panning away and back
+  const mergeLocations = (setData) => (items) => {
+    setData((prev) => {
+      const byName = new Map(prev.map((item) => [item.name, item]));
+      items.forEach((item) => byName.set(item.name, item));
+      return [...byName.values()];
+    });
+    const visibility = {};
+    items.forEach((item) => {
+      if (item.name) {
+        visibility[item.name] = true;
+      }
+    });
+    // New granules start visible; ones already listed keep their state
+    setOverlayVisible((prev) => ({ ...visibility, ...prev }));
+  };
+
+  // Fetch every page of the granules of a dataset that are in view
+  const fetchLocations = async (type, bounds, zoom, signal) => {
+    const items = [];
+    let cursor = null;
+    do {
+      const params = new URLSearchParams({
+        bbox: bounds.toBBoxString(),
+        zoom: String(zoom),
+        limit: String(LOCATION_PAGE_SIZE),
       });
+      if (cursor) {
+        params.set("cursor", cursor);
+      }
+      const response = await fetch(`${BASE_URL}/${type}/get_json?${params}`, { signal });
+      if (!response.ok) {
+        throw new Error(`HTTP ${response.status}`);
+      }
+      items.push(...(await response.json()));
+      cursor = response.headers.get("X-Next-Cursor");
+    } while (cursor);
+    return items;
+  };
+
+  // Fetch the granules of one dataset in view, cancelling its previous fetch so a slow response for an
+  // earlier viewport can never overwrite the current one
+  const loadLayer = (type, bounds, zoom) => {
+    controllers.current[type]?.abort();
+    const controller = new AbortController();
+    controllers.current[type] = controller;
+    const setData = type === "elevation" ? setElevationData : setSwotData;
 
-    // Fetch SWOT data
-    fetch(`${BASE_URL}/swot/get_json`)
-      .then((response) => response.json())
-      .then((data) => {
-        setSwotData(data);
-        const visibility = {};
-        data.forEach((item) => {
-          if (item.name) {
-            visibility[item.name] = true;
-            fetchImage("swot", item.name);
-          }
-        });
-        setOverlayVisible((prev) => ({ ...prev, ...visibility }));
+    fetchLocations(type, bounds, zoom, controller.signal)
+      .then((items) => {
+        mergeLocations(setData)(items);
+        setFetchErrors((prev) => ({ ...prev, [type]: null }));
       })
       .catch((error) => {
-        console.error("Error fetching SWOT data:", error);
-        alert("Error fetching SWOT data: " + error.message);
+        if (error.name === "AbortError") {
+          return;
+        }
+        console.error(`Error fetching ${type} data:`, error);
+        setFetchErrors((prev) => ({ ...prev, [type]: error.message }));
       });
+  };
+
+  // Wait until the map has settled before fetching
+  const handleViewportChange = useCallback((bounds, zoom) => {
+    clearTimeout(viewportTimer.current);
+    viewportTimer.current = setTimeout(() => {
+      LOCATION_LAYERS.forEach((type) => loadLayer(type, bounds, zoom));
+    }, VIEWPORT_DEBOUNCE_MS);
+    // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
-  const fetchImage = (type, name) => {
-    const url =
-      type === "elevation"
-        ? `${BASE_URL}/elevation/get_image?name=${name}`
-        : `${BASE_URL}/swot/get_image?name=${name}`;
+  // Drop the pending and in-flight fetches when the map goes away
+  useEffect(
+    () => () => {
+      clearTimeout(viewportTimer.current);
+      Object.values(controllers.current).forEach((controller) => controller.abort());
+    },
+    []
+  );
 
-    fetch(url)
-      .then((response) => {
-        if (!response.ok) {
-          throw new Error("Image not found");
-        }
-        return response.blob();
-      })
-      .then((blob) => {
-        const imageUrl = URL.createObjectURL(blob);
-        setImages((prevImages) => ({
-          ...prevImages,
-          [name]: imageUrl,
-        }));
-      })
-      .catch((error) => {
-        console.error("Error fetching image:", error);
-      });
+  // Names of the granules of a dataset that are toggled on
+  const visibleNames = (data) =>
+    data
+      .filter((item) => item.name && overlayVisible[item.name])
+      .map((item) => item.name);
+
+  // Build the tile URL of a dataset: the granules toggled off are hidden, or, if fewer are on, only those are
+  // shown, so the URL stays short enough for the server's request-line limit
+  const tileUrl = (type, data) => {
+    const shown = visibleNames(data);
+    const hidden = data
+      .filter((item) => item.name && !overlayVisible[item.name])
+      .map((item) => item.name);
+    let query = "";
+    if (hidden.length && shown.length < hidden.length) {
+      query = `?show=${encodeURIComponent(shown.join(","))}`;
+    } else if (hidden.length) {
+      query = `?hide=${encodeURIComponent(hidden.join(","))}`;
+    }
+    return `${BASE_URL}/${type}/tiles/{z}/{x}/{y}.png${query}`;
   };
 
   const toggleOverlay = (name) => {
@@ -222,25 +272,15 @@ function App() {
           url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png"
         />
 
-        {[...elevationData, ...swotData].map((item, index) => {
-          const bounds = [
-            [item.bounding_box.southwest.lat, item.bounding_box.southwest.lng],
-            [item.bounding_box.northeast.lat, item.bounding_box.northeast.lng],
-          ];
-          return (
-            item.name &&
-            overlayVisible[item.name] &&
-            images[item.name] && (
-              <ImageOverlay
-                key={`${item.name}-${index}`} // Unique key
-                url={images[item.name]}
-                bounds={bounds}
-                opacity={0.7}
-              />
-            )
-          );
-        })}
+        {/* Only the tiles in view are requested from the server, and none while every granule is toggled off */}
+        {visibleNames(elevationData).length > 0 && (
+          <TileLayer url={tileUrl("elevation", elevationData)} opacity={0.7} />
+        )}
+        {visibleNames(swotData).length > 0 && (
+          <TileLayer url={tileUrl("swot", swotData)} opacity={0.7} />
+        )}
 
+        <ViewportWatcher onChange={handleViewportChange} />
         <DrawControl onCreated={handleRectangleDraw} />
       </MapContainer>
 
@@ -277,6 +317,12 @@ function App() {
           </label>
         </div>
 
+        {LOCATION_LAYERS.filter((type) => fetchErrors[type]).map((type) => (
+          <div key={type} style={{ color: "red" }}>
+            Error fetching {type} data: {fetchErrors[type]}
+          </div>
+        ))}
+
         <button onClick={handleCollapseToggle}>
           {isCollapsed ? "Expand Options" : "Collapse Options"}
         </button>
@@ -0,0 +1,19 @@
+import { useEffect } from "react";
+import { useMap, useMapEvents } from "react-leaflet";
+
+// Reports the map's bounds and zoom once on mount and again whenever the view stops moving
+function ViewportWatcher({ onChange }) {
+  const map = useMap();
+
+  useEffect(() => {
+    onChange(map.getBounds(), map.getZoom());
+  }, [map, onChange]);
+
+  useMapEvents({
+    moveend: () => onChange(map.getBounds(), map.getZoom()),
+  });
+
+  return null;
+}
+
+export default ViewportWatcher;